@@ -1,44 +1,24 @@
-import numpy as np
 import matplotlib.pyplot as plt
-from scipy.ndimage import rotate
 
-# Define the function to generate the phantom
-def generate_leg_phantom(leg_radius=50, bone_radius=20, height=100):
-    phantom = np.zeros((height, 2 * leg_radius, 2 * leg_radius))
-    for z in range(height):
-        for x in range(2 * leg_radius):
-            for y in range(2 * leg_radius):
-                distance = np.sqrt((x - leg_radius) ** 2 + (y - leg_radius) ** 2)
-                if distance <= bone_radius:
-                    phantom[z, x, y] = 2  # Bone region
-                elif distance <= leg_radius:
-                    phantom[z, x, y] = 1  # Soft tissue region
-    return phantom
-
-# Generate the phantom
-phantom = generate_leg_phantom()
-
-# Add the functions for contrast and angle analysis (as previously provided)
-def calculate_contrast(phantom_slice):
-    bone_pixels = phantom_slice[phantom_slice == 2]
-    soft_tissue_pixels = phantom_slice[phantom_slice == 1]
-    if bone_pixels.size > 0 and soft_tissue_pixels.size > 0:
-        contrast = np.abs(np.mean(bone_pixels) - np.mean(soft_tissue_pixels))
-    else:
-        contrast = 0
-    return contrast
-
-def generate_angle_projection(phantom, angle):
-    rotated_phantom = rotate(phantom, angle, axes=(1, 2), reshape=False, mode='constant', cval=0)
-    projection = np.sum(rotated_phantom, axis=0)
-    return projection
+from xraysim.instrument import enable_from_environment
+from xraysim.metrics import calculate_contrast, projection_quality, table_rows
+from xraysim.phantom import generate_label_phantom
+from xraysim.projection import PathLengthMap
+from xraysim.sinogram import generate_angle_projections
 
+# Contrast and angle analysis
 def analyze_contrast_and_angle(phantom, slice_index, angles):
     phantom_slice = phantom[slice_index]
     contrast = calculate_contrast(phantom_slice)
     print(f"Contrast for slice {slice_index}: {contrast}")
-    for angle in angles:
-        projection = generate_angle_projection(phantom, angle)
+    projections = generate_angle_projections(phantom, angles)
+    # The volume is counted once; each angle only rotates the count maps
+    counts = PathLengthMap.from_phantom(phantom)
+    path_lengths = [counts.rotated(angle) for angle in angles]
+    for row in table_rows(projection_quality(projections, path_lengths, angles)):
+        print(f"Angle {row['angle']:g}°: contrast {row['contrast']:.2f}, "
+              f"MTF50 {row['mtf50']:.2f} cycles/pixel, edge width {row['edge_width']:.2f} px")
+    for angle, projection in zip(angles, projections):
         plt.figure(figsize=(8, 8))
         plt.imshow(projection, cmap="gray")
         plt.title(f"X-Ray Projection at {angle}°")
@@ -48,6 +28,11 @@ def analyze_contrast_and_angle(phantom, slice_index, angles):
         plt.show()
 
 # Example usage
-slice_index = phantom.shape[0] // 2
-angles = [0, 45, 90, 135]
-analyze_contrast_and_angle(phantom, slice_index, angles)
+if __name__ == "__main__":
+    enable_from_environment()
+    # Generate the phantom
+    phantom = generate_label_phantom()
+
+    slice_index = phantom.shape[0] // 2
+    angles = [0, 45, 90, 135]
+    analyze_contrast_and_angle(phantom, slice_index, angles)
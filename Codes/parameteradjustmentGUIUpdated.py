@@ -1,48 +1,14 @@
 import tkinter as tk
 from tkinter import ttk
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import numpy as np
-from scipy.ndimage import rotate
-
-# Phantom generation function
-def generate_leg_phantom(leg_radius=50, bone_radius=20, height=100):
-    phantom = np.zeros((height, 2 * leg_radius, 2 * leg_radius))
-    for z in range(height):
-        for x in range(2 * leg_radius):
-            for y in range(2 * leg_radius):
-                distance = np.sqrt((x - leg_radius) ** 2 + (y - leg_radius) ** 2)
-                if distance <= bone_radius:
-                    phantom[z, x, y] = 2  # Bone region
-                elif distance <= leg_radius:
-                    phantom[z, x, y] = 1  # Soft tissue region
-    return phantom
-
-# Apply transformations for angle, beam energy, and distance
-def adjust_phantom_slice(slice_image, angle, beam_energy, source_distance):
-    # Determine the padding size to avoid cropping during rotation
-    pad_x = slice_image.shape[0] // 2
-    pad_y = slice_image.shape[1] // 2
-
-    # Pad the slice symmetrically
-    padded_slice = np.pad(slice_image, ((pad_x, pad_x), (pad_y, pad_y)), mode='constant', constant_values=0)
-
-    # Rotate the padded slice
-    rotated_slice = rotate(padded_slice, angle, reshape=False, mode='nearest')
-
-    # Crop back to the original size
-    start_x = (rotated_slice.shape[0] - slice_image.shape[0]) // 2
-    start_y = (rotated_slice.shape[1] - slice_image.shape[1]) // 2
-    cropped_slice = rotated_slice[start_x:start_x + slice_image.shape[0], start_y:start_y + slice_image.shape[1]]
-
-    # Adjust intensity based on beam energy and source distance
-    attenuation_factor = (beam_energy / 100) * (200 / source_distance)
-    adjusted_slice = cropped_slice * attenuation_factor
-
-    # Normalize the values for display (to avoid clipping or too dark visuals)
-    adjusted_slice = np.clip(adjusted_slice / adjusted_slice.max(), 0, 1)
-    return adjusted_slice
 
+from xraysim.cache import ImageCache, phantom_fingerprint
+from xraysim.display import ImageView, ImageWindow, embed_figure
+from xraysim.instrument import TRACER, enable_from_environment
+from xraysim.phantom import generate_label_phantom
+from xraysim.pyramid import LabelPyramid, preview_levels
+from xraysim.rotation import adjust_phantom_slice
+from xraysim.scheduler import RenderScheduler
 
 
 # GUI for parameter adjustment
@@ -55,7 +21,18 @@ class XRaySimulatorApp:
         self.xray_angle = tk.DoubleVar(value=0.0)
         self.source_distance = tk.DoubleVar(value=100.0)
 
-        self.phantom = generate_leg_phantom()
+        self.phantom = generate_label_phantom()
+        slice_index = self.phantom.shape[0] // 2
+        # Labels are uint8; rotate them as floats so interpolation is kept
+        self.slice_image = self.phantom[slice_index].astype(np.float64)
+        # Downsampled copies of the slice; previews rotate the coarsest one
+        # that still fills the screen
+        self.slice_pyramid = LabelPyramid(self.slice_image)
+        # Renders are cached on quantized parameters; the preview and the
+        # visualization window share entries
+        self.cache = ImageCache()
+        # 'level' keys are pyramid indices, so entries from factor-keyed caches never match
+        self.fingerprint = phantom_fingerprint(self.phantom) + f"/slice{slice_index}/pyramid"
         self.setup_gui()
 
     def setup_gui(self):
@@ -74,100 +51,103 @@ class XRaySimulatorApp:
             self.root, from_=50, to=200, variable=self.source_distance, command=self.update_preview)
         self.source_distance_slider.grid(row=2, column=1, padx=10, pady=5)
 
-        self.fig, self.ax = plt.subplots(figsize=(4, 4))
-        self.ax.axis('off')
-        self.image_canvas = FigureCanvasTkAgg(self.fig, master=self.root)
+        self.fig, self.ax, self.image_canvas = embed_figure(self.root, figsize=(4, 4))
         self.image_canvas.get_tk_widget().grid(row=3, column=0, columnspan=3, padx=10, pady=10)
 
         self.visualize_button = ttk.Button(
             self.root, text="Visualize Full Phantom Slice", command=self.open_visualization_window)
         self.visualize_button.grid(row=4, column=0, columnspan=3, pady=10)
 
+        # Per-stage timings drawn over the preview; tracing is off until enabled
+        self.show_timings = tk.BooleanVar(value=False)
+        self.timings_checkbox = ttk.Checkbutton(
+            self.root, text="Show Timings", variable=self.show_timings, command=self.toggle_timings)
+        self.timings_checkbox.grid(row=5, column=0, columnspan=3, pady=5)
+
+        # Created once; every preview only swaps the image data and blits
+        self.preview = ImageView(self.ax, self.image_canvas, shape=self.slice_image.shape)
+        self.visualization = ImageWindow(self.root, "Phantom Slice Visualization", text_color="white")
+
+        # Coarsest pyramid levels that still fill the preview and the visualization window
+        self.visualization_level = self.slice_pyramid.level_for(
+            max(self.visualization.figsize) * self.fig.dpi)
+        self.levels = preview_levels(self.slice_pyramid, max(self.ax.get_window_extent().size))
+        self.scheduler = RenderScheduler(self.root, self.render, self.show_preview, levels=self.levels)
+
         self.update_preview()
 
     def update_preview(self, event=None):
-        slice_index = self.phantom.shape[0] // 2
-        slice_image = self.phantom[slice_index]
-
-        adjusted_image = adjust_phantom_slice(
-            slice_image,
-            angle=self.xray_angle.get(),
-            beam_energy=self.beam_energy.get(),
-            source_distance=self.source_distance.get()
+        # Slider callbacks only queue a render; the scheduler's worker does the work
+        self.scheduler.request(
+            (self.beam_energy.get(), self.xray_angle.get(), self.source_distance.get()))
+
+    def render(self, params, level):
+        beam_energy, angle, source_distance = params
+        # Drafts coarser than the display level use linear interpolation; the
+        # order is part of the key since the display level depends on the window
+        return self.cache.get_or_compute(
+            self.fingerprint,
+            {'beam_energy': beam_energy, 'angle': angle, 'source_distance': source_distance,
+             'level': level, 'order': 1 if level > self.levels[-1] else 3},
+            self.render_level
         )
 
-        self.ax.clear()
-        self.ax.imshow(adjusted_image, cmap="gray", origin="lower")
-        self.ax.set_title(
-            f"Beam Energy={self.beam_energy.get():.1f} keV, "
-            f"Angle={self.xray_angle.get():.1f}°, Distance={self.source_distance.get():.1f} cm"
+    def render_level(self, beam_energy, angle, source_distance, level, order):
+        return adjust_phantom_slice(
+            self.slice_pyramid[level],
+            angle=angle,
+            beam_energy=beam_energy,
+            source_distance=source_distance,
+            order=order
         )
-        self.ax.axis('off')
-        self.image_canvas.draw()
 
-    def open_visualization_window(self):
-        """Open a new window to display the full visualization with details."""
-        slice_index = self.phantom.shape[0] // 2
-        slice_image = self.phantom[slice_index]
-
-        # Apply transformations based on user inputs
-        adjusted_image = adjust_phantom_slice(
-            slice_image,
-            angle=self.xray_angle.get(),
-            beam_energy=self.beam_energy.get(),
-            source_distance=self.source_distance.get()
+    def show_preview(self, params, level, adjusted_image):
+        beam_energy, angle, source_distance = params
+        if self.show_timings.get():
+            self.preview.set_overlay(TRACER.format_summary())
+        self.preview.show(
+            adjusted_image,
+            title=(
+                f"Beam Energy={beam_energy:.1f} keV, "
+                f"Angle={angle:.1f}°, Distance={source_distance:.1f} cm"
+            )
         )
 
-        # Create a new window
-        new_window = tk.Toplevel(self.root)
-        new_window.title("Phantom Slice Visualization")
-
-        # Create the figure
-        fig, ax = plt.subplots(figsize=(6, 6))
-        ax.imshow(adjusted_image, cmap="gray", origin="lower")
-        ax.set_title("Full Phantom Slice Visualization")
-        ax.axis("off")
+    def toggle_timings(self):
+        if self.show_timings.get():
+            TRACER.clear()
+            TRACER.enable(allocations=False)
+        else:
+            TRACER.disable()
+            self.preview.set_overlay("")
+        self.update_preview()
 
-        # Display beam energy, intensity, and angle
+    def open_visualization_window(self):
+        """Show the full visualization with details, reusing the window if it is open."""
         beam_energy = self.beam_energy.get()
         xray_angle = self.xray_angle.get()
         source_distance = self.source_distance.get()
 
-        # Add annotations to the plot
-        ax.text(
-            0.05, 0.95,
-            f"Beam Energy: {beam_energy:.1f} keV",
-            transform=ax.transAxes,
-            fontsize=12,
-            color="white",
-            verticalalignment="top"
-        )
-        ax.text(
-            0.05, 0.90,
-            f"Angle: {xray_angle:.1f}°",
-            transform=ax.transAxes,
-            fontsize=12,
-            color="white",
-            verticalalignment="top"
+        # Usually already cached by the final preview
+        adjusted_image = self.render((beam_energy, xray_angle, source_distance),
+                                     level=self.visualization_level)
+
+        self.visualization.show(
+            adjusted_image,
+            title="Full Phantom Slice Visualization",
+            lines=(
+                f"Beam Energy: {beam_energy:.1f} keV",
+                f"Angle: {xray_angle:.1f}°",
+                f"Source Distance: {source_distance:.1f} cm",
+            )
         )
-        ax.text(
-            0.05, 0.85,
-            f"Source Distance: {source_distance:.1f} cm",
-            transform=ax.transAxes,
-            fontsize=12,
-            color="white",
-            verticalalignment="top"
-        )
-
-        # Embed the figure into the Tkinter window
-        canvas = FigureCanvasTkAgg(fig, master=new_window)
-        canvas.get_tk_widget().pack()
-        canvas.draw()
 
 
 # Run the application
-root = tk.Tk()
-app = XRaySimulatorApp(root)
-root.mainloop()
+if __name__ == "__main__":
+    enable_from_environment()
+    root = tk.Tk()
+    app = XRaySimulatorApp(root)
+    root.mainloop()
 
 
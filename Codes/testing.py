@@ -1,6 +1,9 @@
 import numpy as np
 import matplotlib.pyplot as plt
 
+from xraysim.instrument import enable_from_environment
+from xraysim.sweep import parameter_grid, run_sweep
+
 def generate_xray_image(energy_level, mu_value, angle=0, distance=1):
     x = np.linspace(0, 10, 100)
     y = np.sin(x + np.radians(angle)) * energy_level / 100 * mu_value / distance
@@ -19,7 +22,17 @@ def simulate_leg_fracture(angle):
     plt.ylabel('Intensity')
     plt.show()
 
-def validate_acquisition_parameters(energy_levels, angles, distances):
+def validate_acquisition_parameters(energy_levels, angles, distances, output_dir=None, max_workers=None,
+                                    cache_dir=None):
+    """
+    Plot every energy/angle/distance combination, or, when output_dir is
+    given, run the grid headless across a process pool and store the
+    simulated images and metrics there, reusing images cached in cache_dir.
+    """
+    if output_dir is not None:
+        grid = parameter_grid(energy_levels, angles, distances)
+        return run_sweep(grid, output_dir, max_workers=max_workers, cache_dir=cache_dir)
+
     for energy in energy_levels:
         for angle in angles:
             for distance in distances:
@@ -29,16 +42,18 @@ def validate_leg_fractures(angles):
     for angle in angles:
         simulate_leg_fracture(angle)
 
-# Example values for validation
-energy_levels = [50, 100, 150]
-angles = [0, 30, 60]
-distances = [1, 1.5, 2]
-fracture_angles = [15, 30, 45]
+if __name__ == "__main__":
+    enable_from_environment()
+    # Example values for validation
+    energy_levels = [50, 100, 150]
+    angles = [0, 30, 60]
+    distances = [1, 1.5, 2]
+    fracture_angles = [15, 30, 45]
 
-# Validate acquisition parameters
-print("Validating acquisition parameters...")
-validate_acquisition_parameters(energy_levels, angles, distances)
+    # Validate acquisition parameters
+    print("Validating acquisition parameters...")
+    validate_acquisition_parameters(energy_levels, angles, distances)
 
-# Validate leg fractures
-print("Validating leg fractures...")
-validate_leg_fractures(fracture_angles)
+    # Validate leg fractures
+    print("Validating leg fractures...")
+    validate_leg_fractures(fracture_angles)
@@ -1,46 +1,12 @@
 import tkinter as tk
-from tkinter import Tk, Toplevel, ttk
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import numpy as np
-from scipy.ndimage import rotate  # For smooth angle rotation
-
-
-# Function from X-ray Simulation File
-def generate_leg_phantom(leg_radius=50, bone_radius=20, height=100):
-    phantom = np.zeros((height, 2 * leg_radius, 2 * leg_radius))
-    for z in range(height):
-        for x in range(2 * leg_radius):
-            for y in range(2 * leg_radius):
-                distance = np.sqrt((x - leg_radius) ** 2 + (y - leg_radius) ** 2)
-                if distance <= bone_radius:
-                    phantom[z, x, y] = 2  # Bone region
-                elif distance <= leg_radius:
-                    phantom[z, x, y] = 1  # Soft tissue region
-    return phantom
-
-
-def simulate_xray_image(phantom, beam_energy, source_distance):
-    height, width, depth = phantom.shape
-    reconstructed_image = np.zeros((width, depth))
-
-    # Attenuation factors based on beam energy and tissue type
-    bone_attenuation = 0.5 + (beam_energy / 100) * 0.5  # Adjustable factor for bone
-    tissue_attenuation = 0.2 + (beam_energy / 100) * 0.3  # Adjustable factor for tissue
-
-    # Calculate the X-ray intensity at each point by summing attenuations through the depth
-    for x in range(width):
-        for y in range(depth):
-            attenuation_sum = 0
-            for z in range(height):
-                if phantom[z, x, y] == 2:  # Bone region
-                    attenuation_sum += bone_attenuation
-                elif phantom[z, x, y] == 1:  # Soft tissue region
-                    attenuation_sum += tissue_attenuation
-            # Calculate intensity based on attenuation and distance
-            reconstructed_image[x, y] = np.exp(-attenuation_sum / source_distance)
-
-    return reconstructed_image
+from tkinter import Tk, ttk
+
+from xraysim.cache import ImageCache, phantom_fingerprint
+from xraysim.display import ImageView, ImageWindow, embed_figure
+from xraysim.instrument import TRACER, enable_from_environment
+from xraysim.phantom import generate_label_phantom
+from xraysim.pyramid import PathLengthPyramid, preview_levels
+from xraysim.scheduler import RenderScheduler
 
 
 # GUI for parameter adjustment
@@ -51,7 +17,16 @@ class XRaySimulatorApp:
 
         self.beam_energy = tk.DoubleVar(value=50.0)
         self.source_distance = tk.DoubleVar(value=100.0)
-        self.phantom = generate_leg_phantom()
+        self.phantom = generate_label_phantom()
+        # Per-ray material counts at every pyramid level, so slider changes
+        # never touch the volume and previews only render what the screen shows
+        self.pyramid = PathLengthPyramid(self.phantom)
+        self.path_lengths = self.pyramid[0]
+        # Renders are cached on quantized parameters; the preview and the
+        # visualization window share entries
+        self.cache = ImageCache()
+        # 'level' keys are pyramid indices, so entries from factor-keyed caches never match
+        self.fingerprint = phantom_fingerprint(self.phantom) + "/axial/pyramid"
         self.setup_gui()
 
     def setup_gui(self):
@@ -65,85 +40,89 @@ class XRaySimulatorApp:
             self.root, from_=50, to=200, variable=self.source_distance, command=self.update_preview)
         self.source_distance_slider.grid(row=1, column=1, padx=10, pady=5)
 
-        self.fig, self.ax = plt.subplots(figsize=(4, 4))
-        self.ax.axis('off')
-        self.image_canvas = FigureCanvasTkAgg(self.fig, master=self.root)
+        self.fig, self.ax, self.image_canvas = embed_figure(self.root, figsize=(4, 4))
         self.image_canvas.get_tk_widget().grid(row=2, column=0, columnspan=2, padx=10, pady=10)
 
         self.visualize_button = ttk.Button(
             self.root, text="Visualize Full Phantom Slice", command=self.open_visualization_window)
         self.visualize_button.grid(row=3, column=0, columnspan=2, pady=10)
 
+        # Per-stage timings drawn over the preview; tracing is off until enabled
+        self.show_timings = tk.BooleanVar(value=False)
+        self.timings_checkbox = ttk.Checkbutton(
+            self.root, text="Show Timings", variable=self.show_timings, command=self.toggle_timings)
+        self.timings_checkbox.grid(row=4, column=0, columnspan=2, pady=5)
+
+        # Created once; every preview only swaps the image data and blits
+        self.preview = ImageView(self.ax, self.image_canvas, shape=self.path_lengths.shape)
+        self.visualization = ImageWindow(self.root, "Full X-Ray Image Visualization", text_color="black")
+
+        # Coarsest pyramid levels that still fill the preview and the visualization window
+        self.visualization_level = self.pyramid.level_for(max(self.visualization.figsize) * self.fig.dpi)
+        levels = preview_levels(self.pyramid, max(self.ax.get_window_extent().size))
+        self.scheduler = RenderScheduler(self.root, self.render, self.show_preview, levels=levels)
+
         self.update_preview()
 
     def update_preview(self, event=None):
-        reconstructed_image = simulate_xray_image(
-            self.phantom,
-            self.beam_energy.get(),
-            self.source_distance.get()
-        )
-
-        self.ax.clear()
-        self.ax.imshow(reconstructed_image, cmap="gray", origin="lower")
-        self.ax.set_title(
-            f"Beam Energy={self.beam_energy.get():.1f} keV, "
-            f"Source Distance={self.source_distance.get():.1f} cm"
+        # Slider callbacks only queue a render; the scheduler's worker does the work
+        self.scheduler.request((self.beam_energy.get(), self.source_distance.get()))
+
+    def render(self, params, level):
+        beam_energy, source_distance = params
+        return self.cache.get_or_compute(
+            self.fingerprint,
+            {'beam_energy': beam_energy, 'source_distance': source_distance, 'level': level},
+            self.render_level
         )
-        self.ax.axis('off')
-        self.image_canvas.draw()
 
-    def open_visualization_window(self):
-        """Open a new window to display the full visualization with details."""
-        slice_index = self.phantom.shape[0] // 2
-        slice_image = self.phantom[slice_index]
-
-        # Apply transformations based on user inputs
-        adjusted_image = simulate_xray_image(
-            self.phantom,
-            self.beam_energy.get(),
-            self.source_distance.get()
+    def render_level(self, beam_energy, source_distance, level):
+        return self.pyramid[level].render(beam_energy, source_distance)
+
+    def show_preview(self, params, level, reconstructed_image):
+        beam_energy, source_distance = params
+        if self.show_timings.get():
+            self.preview.set_overlay(TRACER.format_summary())
+        self.preview.show(
+            reconstructed_image,
+            title=(
+                f"Beam Energy={beam_energy:.1f} keV, "
+                f"Source Distance={source_distance:.1f} cm"
+            )
         )
 
-        # Create a new window
-        new_window = tk.Toplevel(self.root)
-        new_window.title("Full X-Ray Image Visualization")
-
-        # Create the figure
-        fig, ax = plt.subplots(figsize=(6, 6))
-        ax.imshow(adjusted_image, cmap="gray", origin="lower")
-        ax.set_title("Full X-Ray Image")
-        ax.axis("off")
+    def toggle_timings(self):
+        if self.show_timings.get():
+            TRACER.clear()
+            TRACER.enable(allocations=False)
+        else:
+            TRACER.disable()
+            self.preview.set_overlay("")
+        self.update_preview()
 
-        # Display beam energy, intensity, and angle
+    def open_visualization_window(self):
+        """Show the full visualization with details, reusing the window if it is open."""
         beam_energy = self.beam_energy.get()
         source_distance = self.source_distance.get()
 
-        # Add annotations to the plot (with black text color)
-        ax.text(
-            0.05, 0.95,
-            f"Beam Energy: {beam_energy:.1f} keV",
-            transform=ax.transAxes,
-            fontsize=12,
-            color="black",
-            verticalalignment="top"
-        )
-        ax.text(
-            0.05, 0.90,
-            f"Source Distance: {source_distance:.1f} cm",
-            transform=ax.transAxes,
-            fontsize=12,
-            color="black",
-            verticalalignment="top"
+        # Usually already cached by the final preview
+        adjusted_image = self.render((beam_energy, source_distance), level=self.visualization_level)
+
+        # Annotations are drawn in black over the image
+        self.visualization.show(
+            adjusted_image,
+            title="Full X-Ray Image",
+            lines=(
+                f"Beam Energy: {beam_energy:.1f} keV",
+                f"Source Distance: {source_distance:.1f} cm",
+            )
         )
 
-        # Embed the figure into the Tkinter window
-        canvas = FigureCanvasTkAgg(fig, master=new_window)
-        canvas.get_tk_widget().pack()
-        canvas.draw()
-
 
 # Run the application
-root = Tk()
-app = XRaySimulatorApp(root)
-root.mainloop()
+if __name__ == "__main__":
+    enable_from_environment()
+    root = Tk()
+    app = XRaySimulatorApp(root)
+    root.mainloop()
 
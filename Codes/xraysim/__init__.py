@@ -0,0 +1,8 @@
+"""
+Shared building blocks for the leg phantom X-ray simulation scripts.
+
+Only NumPy-level modules are imported here so that the package can be used
+from batch jobs without pulling in the GUI stack.
+"""
+
+from .phantom import clear_phantom_cache, generate_leg_phantom
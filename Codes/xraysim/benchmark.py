@@ -0,0 +1,205 @@
+import csv
+import dataclasses
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from .metrics import calculate_contrast, volume_quality
+from .phantom import clear_phantom_cache, generate_label_phantom, generate_leg_phantom
+from .projection import simulate_xray_image
+from .rotation import adjust_phantom_slice
+from .sinogram import forward_project, generate_angle_projections
+from .splits import add_angled_split
+from .sweep import parameter_grid, run_sweep
+
+# Default scaling axes: phantom edge length (height = 2 * leg radius), number
+# of projection angles and number of sweep worker processes
+DEFAULT_SIZES = (64, 128, 256, 512)
+DEFAULT_ANGLE_COUNTS = (1, 8, 32)
+DEFAULT_WORKER_COUNTS = (1, 2, 4)
+
+# A stage is reported as a regression when it is this much slower than the
+# baseline, ignoring differences below MIN_SECONDS (timer noise)
+DEFAULT_THRESHOLD = 0.25
+MIN_SECONDS = 1e-3
+
+RESULT_FIELDS = ('stage', 'size', 'angles', 'workers', 'seconds', 'peak_bytes')
+
+
+@dataclasses.dataclass
+class BenchmarkResult:
+    """Best wall time and peak traced allocation of one stage at one setting."""
+
+    stage: str
+    size: int
+    angles: int
+    workers: int
+    seconds: float
+    peak_bytes: int
+
+    @property
+    def key(self):
+        return self.stage, self.size, self.angles, self.workers
+
+
+def measure(run, setup=None, repeat=3):
+    """
+    Best of `repeat` timings of run(setup()), then one extra run under
+    tracemalloc for the peak allocation. Setup time is not counted. Memory
+    allocated in worker processes is not seen by tracemalloc.
+    """
+    best = np.inf
+    for _ in range(repeat):
+        args = setup() if setup is not None else ()
+        start = time.perf_counter()
+        run(*args)
+        best = min(best, time.perf_counter() - start)
+
+    args = setup() if setup is not None else ()
+    tracemalloc.start()
+    try:
+        run(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def _stages(size, angle_counts, worker_counts, scratch_dir):
+    """Yield (stage, angles, workers, run, setup) for one phantom size."""
+    leg_radius, bone_radius, height = size // 2, size // 5, size
+    phantom = generate_label_phantom(leg_radius, bone_radius, height)
+    slice_image = phantom[height // 2].astype(np.float64)
+
+    def fresh_cache():
+        clear_phantom_cache()
+        return ()
+
+    yield ('generate_leg_phantom', 1, 1,
+           lambda: generate_leg_phantom(leg_radius, bone_radius, height), fresh_cache)
+    yield ('simulate_xray_image', 1, 1,
+           lambda: simulate_xray_image(phantom, 50.0, 100.0), None)
+    yield ('add_angled_split', 1, 1,
+           lambda labels: add_angled_split(labels, -0.5, 0, leg_radius, leg_radius, height // 2),
+           lambda: (np.array(phantom.labels),))
+    yield ('calculate_contrast', 1, 1,
+           lambda: [calculate_contrast(phantom[z]) for z in range(height)], None)
+    yield ('volume_quality', 1, 1, lambda: volume_quality(phantom), None)
+
+    for n_angles in angle_counts:
+        angles = np.linspace(0, 180, n_angles, endpoint=False).tolist()
+        yield ('generate_angle_projection', n_angles, 1,
+               lambda angles=angles: generate_angle_projections(phantom, angles), None)
+        yield ('forward_project', n_angles, 1,
+               lambda angles=angles: forward_project(phantom, angles), None)
+        yield ('adjust_phantom_slice', n_angles, 1,
+               lambda angles=angles: [adjust_phantom_slice(slice_image, angle, 50.0, 100.0)
+                                      for angle in angles], None)
+
+    grid = parameter_grid([50.0], np.linspace(0, 180, max(angle_counts), endpoint=False), [100.0])
+    params = {'leg_radius': leg_radius, 'bone_radius': bone_radius, 'height': height}
+    for workers in worker_counts:
+        output_dir = os.path.join(scratch_dir, f"sweep_{size}_{workers}")
+        yield ('run_sweep', len(grid), workers,
+               lambda output_dir=output_dir, workers=workers:
+               run_sweep(grid, output_dir, params, workers, cache_dir=None), None)
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, angle_counts=DEFAULT_ANGLE_COUNTS,
+                   worker_counts=DEFAULT_WORKER_COUNTS, repeat=3, stages=None, progress=None):
+    """
+    Time every pipeline stage over the given phantom sizes, angle counts and
+    worker counts. `stages` restricts the run to the named stages;
+    progress(result) is called after each measurement.
+    """
+    results = []
+    scratch_dir = tempfile.mkdtemp(prefix='xraysim-bench-')
+    try:
+        for size in sizes:
+            for stage, angles, workers, run, setup in _stages(size, angle_counts, worker_counts,
+                                                              scratch_dir):
+                if stages is not None and stage not in stages:
+                    continue
+                seconds, peak = measure(run, setup, repeat)
+                result = BenchmarkResult(stage, size, angles, workers, seconds, peak)
+                results.append(result)
+                if progress is not None:
+                    progress(result)
+            clear_phantom_cache()
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+    return results
+
+
+def write_results(results, output_dir):
+    """Write results.json (with machine details) and results.csv to output_dir."""
+    os.makedirs(output_dir, exist_ok=True)
+    rows = [dataclasses.asdict(result) for result in results]
+    with open(os.path.join(output_dir, 'results.json'), 'w') as handle:
+        json.dump({'machine': {'platform': platform.platform(), 'python': platform.python_version(),
+                               'numpy': np.__version__, 'cpus': os.cpu_count()},
+                   'results': rows}, handle, indent=2)
+    with open(os.path.join(output_dir, 'results.csv'), 'w', newline='') as handle:
+        writer = csv.DictWriter(handle, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def load_results(path):
+    """Read the results of a results.json file (for example a stored baseline)."""
+    with open(path) as handle:
+        return [BenchmarkResult(**row) for row in json.load(handle)['results']]
+
+
+def compare_to_baseline(results, baseline, threshold=DEFAULT_THRESHOLD, min_seconds=MIN_SECONDS):
+    """
+    Settings that got slower than the baseline by more than `threshold`
+    (0.25 = 25 %), as (result, baseline_seconds, ratio) tuples. Settings
+    missing from the baseline are skipped.
+    """
+    reference = {result.key: result.seconds for result in baseline}
+    regressions = []
+    for result in results:
+        before = reference.get(result.key)
+        if before is None or result.seconds - before < min_seconds:
+            continue
+        ratio = result.seconds / before
+        if ratio > 1 + threshold:
+            regressions.append((result, before, ratio))
+    return regressions
+
+
+def plot_scaling(results, path):
+    """
+    Save log-log scaling curves of time and peak memory against phantom
+    size, one line per stage and angle/worker setting.
+    """
+    from matplotlib.figure import Figure
+
+    curves = {}
+    for result in results:
+        label = f"{result.stage} (angles={result.angles}, workers={result.workers})"
+        curves.setdefault(label, []).append(result)
+
+    fig = Figure(figsize=(14, 6))
+    time_ax, memory_ax = fig.subplots(1, 2)
+    for label, points in sorted(curves.items()):
+        points.sort(key=lambda result: result.size)
+        sizes = [result.size for result in points]
+        time_ax.plot(sizes, [result.seconds for result in points], marker='o', label=label)
+        memory_ax.plot(sizes, [result.peak_bytes / 2 ** 20 for result in points], marker='o')
+    for ax, ylabel in ((time_ax, "Time (s)"), (memory_ax, "Peak traced memory (MiB)")):
+        ax.set_xscale('log', base=2)
+        ax.set_yscale('log')
+        ax.set_xlabel("Phantom size (voxels per edge)")
+        ax.set_ylabel(ylabel)
+        ax.grid(True, which='both', alpha=0.3)
+    time_ax.legend(fontsize=6)
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
@@ -0,0 +1,143 @@
+import collections
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from .volume import DEFAULT_Z_CHUNK, iter_z_chunks
+
+# Default memory budget of an ImageCache
+DEFAULT_MAX_BYTES = 256 * 2 ** 20
+
+# Optional on-disk tier shared by every ImageCache, off unless the variable is
+# set; system matrices have their own cache (XRAYSIM_CACHE_DIR, see iterative.py)
+DEFAULT_CACHE_DIR = os.environ.get('XRAYSIM_IMAGE_CACHE_DIR')
+
+# Default quantization step of each simulation parameter; parameters not
+# listed are used exactly
+DEFAULT_QUANTIZATION = {'beam_energy': 0.1, 'source_distance': 0.1, 'angle': 0.1}
+
+
+def phantom_fingerprint(phantom, chunk_size=DEFAULT_Z_CHUNK):
+    """
+    Content hash of a phantom: its voxels, shape, dtype and material table.
+    Hashed in z-chunks, so memmaps and edited phantoms are never loaded
+    whole.
+    """
+    digest = hashlib.sha1(repr((tuple(phantom.shape), np.dtype(phantom.dtype).str)).encode())
+    materials = getattr(phantom, 'materials', None)
+    if materials is not None:
+        digest.update(repr(list(materials)).encode())
+    for z_start, z_end in iter_z_chunks(phantom.shape[0], chunk_size):
+        digest.update(np.ascontiguousarray(phantom[z_start:z_end]).tobytes())
+    return digest.hexdigest()
+
+
+def quantize(params, steps=DEFAULT_QUANTIZATION):
+    """
+    Round every parameter that has a step to a multiple of it, so nearby
+    slider positions share one cache entry.
+    """
+    quantized = {}
+    for name, value in params.items():
+        step = steps.get(name)
+        if step:
+            value = round(round(value / step) * step, 10)
+        quantized[name] = value
+    return quantized
+
+
+class ImageCache:
+    """
+    Content-addressed cache of simulated images.
+
+    Entries are keyed on the phantom fingerprint plus the quantized
+    parameters, and `compute` is always called with the quantized values, so
+    a cached image is exactly what those parameters produce. The memory tier
+    is an LRU bounded by `max_bytes`; with `cache_dir` set, images are also
+    written there as .npy files and served from disk in later sessions.
+    Cached images are read-only. Safe to share between threads.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, quantization=None, cache_dir=DEFAULT_CACHE_DIR):
+        self.max_bytes = max_bytes
+        self.quantization = DEFAULT_QUANTIZATION if quantization is None else quantization
+        self.cache_dir = cache_dir
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, fingerprint, params):
+        """Return (key, quantized_params) for a render of `params`."""
+        quantized = quantize(params, self.quantization)
+        text = json.dumps([fingerprint, quantized], sort_keys=True)
+        return hashlib.sha1(text.encode()).hexdigest(), quantized
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def get(self, key):
+        """Cached image for `key`, or None."""
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return image
+        if self.cache_dir is not None and os.path.exists(self._path(key)):
+            image = np.load(self._path(key))
+            self._remember(key, image)
+            with self._lock:
+                self.hits += 1
+            return image
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _remember(self, key, image):
+        image.setflags(write=False)
+        if image.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key).nbytes
+            self._entries[key] = image
+            self.nbytes += image.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def put(self, key, image):
+        image = np.array(image)
+        self._remember(key, image)
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write under a temporary name so concurrent readers never see half a file
+            temporary = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp.npy"
+            np.save(temporary, image)
+            os.replace(temporary, self._path(key))
+        return image
+
+    def get_or_compute(self, fingerprint, params, compute):
+        """
+        Cached image for `params`, or the result of compute(**quantized_params)
+        stored under it.
+        """
+        key, quantized = self.key(fingerprint, params)
+        image = self.get(key)
+        if image is None:
+            image = self.put(key, compute(**quantized))
+        return image
+
+    def clear(self):
+        """Empty the memory tier; files in cache_dir are kept."""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
@@ -0,0 +1,310 @@
+import argparse
+import json
+import os
+import sys
+
+# Only NumPy is imported at startup; simulation modules are imported by the
+# subcommand that needs them, and matplotlib (without pyplot or Tk) only when
+# a PNG is written
+import numpy as np
+
+
+def _save_png(path, image):
+    from matplotlib.image import imsave
+
+    imsave(path, image, cmap="gray", origin="lower")
+
+
+def _save_pngs(directory, images, names):
+    os.makedirs(directory, exist_ok=True)
+    for image, name in zip(images, names):
+        _save_png(os.path.join(directory, f"{name}.png"), image)
+
+
+def _load_phantom(args):
+    from .dataset import ChunkedDataset, is_dataset
+    from .phantom import generate_label_phantom
+
+    if args.phantom is not None and is_dataset(args.phantom):
+        return ChunkedDataset(args.phantom)
+    if args.phantom is not None:
+        return np.load(args.phantom, mmap_mode='r')
+    return generate_label_phantom(args.leg_radius, args.bone_radius, args.height)
+
+
+def _add_size_arguments(parser):
+    parser.add_argument('--leg-radius', type=int, default=50)
+    parser.add_argument('--bone-radius', type=int, default=20)
+    parser.add_argument('--height', type=int, default=100)
+
+
+def cmd_phantom(args):
+    from .phantom import fill_leg_phantom
+    from .volume import create_memmap_volume
+
+    # Written chunk by chunk straight into the output file
+    shape = (args.height, 2 * args.leg_radius, 2 * args.leg_radius)
+    volume = create_memmap_volume(args.output, shape, np.uint8)
+    fill_leg_phantom(volume, args.leg_radius, args.bone_radius)
+    volume.flush()
+    if args.png:
+        _save_png(args.png, volume[args.height // 2])
+    print(f"wrote {args.output} {shape}")
+
+
+def cmd_project(args):
+    from .projection import PathLengthMap
+
+    phantom = _load_phantom(args)
+    angles = args.angles or [0.0]
+
+    if args.sinogram and args.geometry == 'cone':
+        sys.exit("xraysim project: --sinogram is parallel-beam only")
+    if args.sinogram:
+        from .sinogram import forward_project
+
+        sinogram = forward_project(phantom, angles)
+        np.savez(args.output, sinogram=sinogram, angles=np.asarray(angles, dtype=np.float64),
+                 shape=np.asarray(phantom.shape[1:]))
+        images = sinogram
+    elif args.geometry == 'cone':
+        from .conebeam import ConeBeamGeometry, cone_beam_path_lengths, render_cone_beam
+
+        geometries = [ConeBeamGeometry.for_phantom(phantom, args.source_distance, args.detector_distance,
+                                                   angle)
+                      for angle in angles]
+        path_lengths = [cone_beam_path_lengths(phantom, geometry) for geometry in geometries]
+        images = np.stack([render_cone_beam(maps, args.beam_energy, geometry, phantom.shape)
+                           for maps, geometry in zip(path_lengths, geometries)])
+        np.save(args.output, images)
+    else:
+        counts = PathLengthMap.from_phantom(phantom)
+        path_lengths = [counts.rotated(angle) for angle in angles]
+        images = np.stack([maps.render(args.beam_energy, args.source_distance) for maps in path_lengths])
+        np.save(args.output, images)
+
+    if args.metrics:
+        from .metrics import projection_quality, sinogram_quality, write_table
+
+        if args.sinogram:
+            # Side views: regions come from projecting the bone and tissue masks
+            table = sinogram_quality(images, phantom, angles)
+        else:
+            table = projection_quality(images, path_lengths, angles)
+        write_table(table, args.metrics)
+
+    if args.png:
+        _save_pngs(args.png, images, [f"angle_{angle:g}" for angle in angles])
+    print(f"wrote {args.output} {images.shape}")
+
+
+def cmd_reconstruct(args):
+    data = np.load(args.sinogram)
+    sinogram, angles, shape = data['sinogram'], data['angles'], tuple(data['shape'])
+
+    if args.method == 'fbp':
+        from .reconstruction import fbp_reconstruct
+
+        volume = fbp_reconstruct(sinogram, angles, args.filter, shape)
+    else:
+        from . import iterative
+
+        method = getattr(iterative, args.method)
+        result = method(sinogram, angles, shape, n_subsets=args.subsets,
+                        max_iterations=args.iterations)
+        volume = result.volume
+        print(f"{args.method}: {result.iterations} iterations, residual {result.residuals[-1]:.4g}")
+
+    np.save(args.output, volume)
+    if args.png:
+        _save_png(args.png, volume[volume.shape[0] // 2])
+    print(f"wrote {args.output} {volume.shape}")
+
+
+def cmd_detect(args):
+    import dataclasses
+
+    from .fractures import DEFAULT_LEVEL, FractureDetector
+
+    data = np.load(args.sinogram)
+    detector = FractureDetector(level=DEFAULT_LEVEL if args.level is None else args.level)
+    detector.update(data['sinogram'], data['angles'])
+    fractures = [dict(dataclasses.asdict(fracture), tilt=fracture.tilt)
+                 for fracture in detector.fractures()]
+    plane = detector.plane()
+    print(json.dumps({'fractures': fractures,
+                      'plane': None if plane is None else {'m': plane[0], 'n': plane[1]}}, indent=2))
+
+
+def cmd_sweep(args):
+    from .sweep import parameter_grid, run_sweep
+
+    grid = parameter_grid(args.energies, args.angles, args.distances)
+    phantom_params = {'leg_radius': args.leg_radius, 'bone_radius': args.bone_radius,
+                      'height': args.height}
+    results = run_sweep(grid, args.output_dir, phantom_params, args.workers, args.cache_dir,
+                        args.chunked, args.geometry, args.detector_distance)
+    if args.png and args.chunked:
+        from .dataset import ChunkedDataset
+
+        dataset = ChunkedDataset(os.path.join(args.output_dir, 'images'))
+        _save_pngs(os.path.join(args.output_dir, 'png'), dataset,
+                   [f"case_{row['case']:05d}" for row in results])
+    elif args.png:
+        images = (np.load(os.path.join(args.output_dir, row['image'])) for row in results)
+        names = (os.path.splitext(os.path.basename(row['image']))[0] for row in results)
+        _save_pngs(os.path.join(args.output_dir, 'png'), images, names)
+    print(json.dumps({'cases': len(results), 'output_dir': args.output_dir}))
+
+
+def cmd_import(args):
+    from .dataset import import_npy
+
+    dataset = import_npy(args.source, args.output, args.chunk_size)
+    print(f"wrote {args.output} {dataset.shape} {dataset.dtype}: "
+          f"{dataset.stored_bytes / 2 ** 20:.1f} MiB on disk for {dataset.nbytes / 2 ** 20:.1f} MiB of data")
+
+
+def cmd_bench(args):
+    from . import benchmark
+
+    def report(result):
+        print(f"{result.stage:28s} size={result.size:<4d} angles={result.angles:<4d} "
+              f"workers={result.workers:<2d} {result.seconds:9.4f} s "
+              f"{result.peak_bytes / 2 ** 20:9.1f} MiB")
+
+    results = benchmark.run_benchmarks(args.sizes, args.angles, args.workers, args.repeat,
+                                       args.stages, progress=report)
+    benchmark.write_results(results, args.output_dir)
+    if args.plot:
+        benchmark.plot_scaling(results, os.path.join(args.output_dir, 'scaling.png'))
+
+    if args.baseline is None:
+        return 0
+    regressions = benchmark.compare_to_baseline(
+        results, benchmark.load_results(args.baseline), args.threshold)
+    for result, before, ratio in regressions:
+        print(f"REGRESSION {result.stage} size={result.size} angles={result.angles} "
+              f"workers={result.workers}: {before:.4f} s -> {result.seconds:.4f} s ({ratio:.2f}x)")
+    return 1 if regressions else 0
+
+
+def _add_geometry_arguments(parser):
+    # NumPy-level module, already loaded with the package
+    from .conebeam import DEFAULT_DETECTOR_DISTANCE
+
+    parser.add_argument('--geometry', choices=('parallel', 'cone'), default='parallel',
+                        help="cone: divergent beam, so the source distance sets magnification and falloff")
+    parser.add_argument('--detector-distance', type=float, default=DEFAULT_DETECTOR_DISTANCE,
+                        help="cone-beam axis to detector distance in cm")
+
+
+def build_parser():
+    # NumPy-level module, already loaded with the package
+    from .volume import DEFAULT_Z_CHUNK
+
+    parser = argparse.ArgumentParser(prog='xraysim', description="Headless leg phantom X-ray simulation.")
+    parser.add_argument('--trace', metavar='PATH', help="write a Chrome trace of the pipeline stages")
+    parser.add_argument('--trace-allocations', action='store_true',
+                        help="record net allocations per span (slower)")
+    parser.add_argument('--profile', action='store_true', help="print a cProfile report")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    phantom = commands.add_parser('phantom', help="write a label phantom to a .npy file")
+    phantom.add_argument('output')
+    _add_size_arguments(phantom)
+    phantom.add_argument('--png', help="also save the middle slice as a PNG")
+    phantom.set_defaults(func=cmd_phantom)
+
+    convert = commands.add_parser('import', help="convert a .npy volume to a chunked dataset")
+    convert.add_argument('source', help=".npy volume, read through a memory map")
+    convert.add_argument('output', help="dataset directory to create")
+    convert.add_argument('--chunk-size', type=int, default=DEFAULT_Z_CHUNK,
+                         help="z-slices per compressed chunk")
+    convert.set_defaults(func=cmd_import)
+
+    project = commands.add_parser('project', help="simulate X-ray images or a sinogram")
+    project.add_argument('output', help=".npy image stack, or .npz with --sinogram")
+    project.add_argument('--phantom', help="label volume (.npy or chunked dataset directory)")
+    _add_size_arguments(project)
+    project.add_argument('--angles', type=float, nargs='+')
+    project.add_argument('--beam-energy', type=float, default=50.0)
+    project.add_argument('--source-distance', type=float, default=100.0)
+    _add_geometry_arguments(project)
+    project.add_argument('--sinogram', action='store_true',
+                         help="write parallel-beam line integrals for 'xraysim reconstruct'")
+    project.add_argument('--png', help="directory for one PNG per angle")
+    project.add_argument('--metrics', help="CSV file for per-angle contrast, CNR, SNR and MTF50")
+    project.set_defaults(func=cmd_project)
+
+    reconstruct = commands.add_parser('reconstruct', help="reconstruct a volume from a sinogram")
+    reconstruct.add_argument('sinogram', help=".npz written by 'xraysim project --sinogram'")
+    reconstruct.add_argument('output')
+    reconstruct.add_argument('--method', choices=('fbp', 'sart', 'osem'), default='fbp')
+    reconstruct.add_argument('--filter', default='ramp')
+    reconstruct.add_argument('--iterations', type=int, default=50)
+    reconstruct.add_argument('--subsets', type=int, default=10)
+    reconstruct.add_argument('--png', help="also save the middle slice as a PNG")
+    reconstruct.set_defaults(func=cmd_reconstruct)
+
+    detect = commands.add_parser('detect', help="locate fractures in a projection stack")
+    detect.add_argument('sinogram', help=".npz written by 'xraysim project --sinogram'")
+    # The default comes from xraysim.fractures, imported (with SciPy) only by the command
+    detect.add_argument('--level', type=float,
+                        help="fraction of the intact bone shadow below which a row is broken "
+                             "(default: fractures.DEFAULT_LEVEL, 0.5)")
+    detect.set_defaults(func=cmd_detect)
+
+    sweep = commands.add_parser('sweep', help="run a parameter sweep across a process pool")
+    sweep.add_argument('output_dir')
+    sweep.add_argument('--energies', type=float, nargs='+', default=[50.0, 100.0, 150.0])
+    sweep.add_argument('--angles', type=float, nargs='+', default=[0.0, 30.0, 60.0])
+    sweep.add_argument('--distances', type=float, nargs='+', default=[100.0, 150.0, 200.0])
+    _add_size_arguments(sweep)
+    _add_geometry_arguments(sweep)
+    sweep.add_argument('--workers', type=int)
+    sweep.add_argument('--cache-dir')
+    sweep.add_argument('--chunked', action='store_true',
+                       help="store the images as one compressed chunked dataset")
+    sweep.add_argument('--png', action='store_true', help="also save every image as a PNG")
+    sweep.set_defaults(func=cmd_sweep)
+
+    bench = commands.add_parser('bench', help="time the pipeline stages and check for regressions")
+    bench.add_argument('output_dir', help="directory for results.json, results.csv and scaling.png")
+    bench.add_argument('--sizes', type=int, nargs='+', default=[64, 128, 256, 512])
+    bench.add_argument('--angles', type=int, nargs='+', default=[1, 8, 32])
+    bench.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    bench.add_argument('--repeat', type=int, default=3)
+    bench.add_argument('--stages', nargs='+', help="only run these stages")
+    bench.add_argument('--plot', action='store_true', help="save scaling curves")
+    bench.add_argument('--baseline', help="results.json of an earlier run to compare against")
+    bench.add_argument('--threshold', type=float, default=0.25,
+                       help="fail when a stage is this much slower than the baseline")
+    bench.set_defaults(func=cmd_bench)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not (args.trace or args.profile):
+        from .instrument import enable_from_environment
+
+        enable_from_environment()
+        return args.func(args) or 0
+
+    from .instrument import TRACER
+
+    TRACER.enable(allocations=args.trace_allocations, profile=args.profile)
+    try:
+        status = args.func(args) or 0
+    finally:
+        TRACER.disable()
+        if args.trace:
+            TRACER.export_chrome_trace(args.trace)
+        if args.profile:
+            print(TRACER.profile_stats())
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,276 @@
+import bisect
+import collections
+import json
+import os
+
+import numpy as np
+
+from .volume import DEFAULT_Z_CHUNK, iter_z_chunks
+
+MANIFEST_NAME = 'manifest.json'
+FORMAT_NAME = 'xraysim-chunked'
+FORMAT_VERSION = 1
+
+# Decompressed chunks kept in memory by each open dataset
+DEFAULT_CHUNK_CACHE = 4
+
+
+def _write_manifest(path, manifest):
+    # Written to a temporary file first so readers never see a partial manifest
+    target = os.path.join(path, MANIFEST_NAME)
+    temporary = target + '.tmp'
+    with open(temporary, 'w') as handle:
+        json.dump(manifest, handle, indent=1)
+    os.replace(temporary, target)
+
+
+def is_dataset(path):
+    return os.path.isfile(os.path.join(path, MANIFEST_NAME))
+
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST_NAME)) as handle:
+        manifest = json.load(handle)
+    if manifest.get('format') != FORMAT_NAME:
+        raise ValueError(f"{path} is not a chunked xraysim dataset")
+    return manifest
+
+
+class ChunkedDataset:
+    """
+    Read-only view of a chunked dataset directory.
+
+    The array is split along its first axis (z for volumes, angle for
+    projection stacks) into compressed .npz chunks listed in manifest.json.
+    Indexing only decompresses the chunks a first-axis selection touches,
+    so z-range or angle-range reads of a large volume never load the whole
+    file. It behaves like a volume (shape, dtype, slicing) and can be
+    passed wherever phantoms are read chunk by chunk.
+    """
+
+    def __init__(self, path, cache_size=DEFAULT_CHUNK_CACHE):
+        self.path = path
+        self.manifest = read_manifest(path)
+        self.shape = (self.manifest['length'],) + tuple(self.manifest['item_shape'])
+        self.dtype = np.dtype(self.manifest['dtype'])
+        self.axis = self.manifest['axis']
+        self.attrs = self.manifest['attrs']
+        self.coordinates = (None if self.manifest['coordinates'] is None
+                            else np.asarray(self.manifest['coordinates'], dtype=np.float64))
+        self._starts = [chunk['start'] for chunk in self.manifest['chunks']]
+        self._cache = collections.OrderedDict()
+        self.cache_size = cache_size
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    @property
+    def stored_bytes(self):
+        """Size of the compressed chunks on disk."""
+        return sum(chunk['bytes'] for chunk in self.manifest['chunks'])
+
+    def __len__(self):
+        return self.shape[0]
+
+    def refresh(self):
+        """Pick up chunks appended by a writer since the dataset was opened."""
+        self.__init__(self.path, self.cache_size)
+
+    def _chunk(self, index):
+        if index in self._cache:
+            self._cache.move_to_end(index)
+            return self._cache[index]
+        with np.load(os.path.join(self.path, self.manifest['chunks'][index]['file'])) as archive:
+            data = archive['data']
+        data.setflags(write=False)
+        self._cache[index] = data
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return data
+
+    def read(self, start, stop):
+        """Rows [start, stop) along the first axis as a new array."""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        out = np.empty((max(0, stop - start),) + self.shape[1:], dtype=self.dtype)
+        if stop <= start:
+            return out
+        first = bisect.bisect_right(self._starts, start) - 1
+        for index in range(first, len(self._starts)):
+            chunk = self.manifest['chunks'][index]
+            if chunk['start'] >= stop:
+                break
+            low, high = max(start, chunk['start']), min(stop, chunk['stop'])
+            out[low - start:high - start] = self._chunk(index)[low - chunk['start']:high - chunk['start']]
+        return out
+
+    def __getitem__(self, key):
+        key = key if isinstance(key, tuple) else (key,)
+        first, rest = key[0], key[1:]
+        if isinstance(first, (int, np.integer)):
+            index = range(len(self))[first]
+            return self.read(index, index + 1)[0][rest]
+        if isinstance(first, slice):
+            start, stop, step = first.indices(len(self))
+            if step < 0:
+                return self.read(0, len(self))[(first,) + rest]
+            return self.read(start, stop)[(slice(None, None, step),) + rest]
+        # Fancy indexing along the first axis reads everything
+        return np.asarray(self)[key]
+
+    def __array__(self, dtype=None, copy=None):
+        data = self.read(0, len(self))
+        return data if dtype is None else data.astype(dtype)
+
+    def select(self, low, high):
+        """
+        Coordinates and rows whose coordinate (for example the projection
+        angle) lies in [low, high), read lazily like a slice.
+        """
+        if self.coordinates is None:
+            raise ValueError("dataset has no coordinates")
+        inside = np.flatnonzero((self.coordinates >= low) & (self.coordinates < high))
+        if inside.size == 0:
+            return self.coordinates[inside], self.read(0, 0)
+        rows = self.read(inside[0], inside[-1] + 1)
+        return self.coordinates[inside], rows[inside - inside[0]]
+
+
+class DatasetWriter:
+    """
+    Append-only writer of a chunked dataset.
+
+    Rows appended along the first axis are buffered until a chunk is full,
+    then compressed to their own file and added to the manifest, which is
+    rewritten atomically. Readers (and a crashed writer) therefore always
+    see a valid dataset holding every completed chunk; close() also writes
+    the last, partial chunk. Reopening an existing dataset with
+    DatasetWriter.open continues after its last row.
+    """
+
+    def __init__(self, path, item_shape, dtype, chunk_size=DEFAULT_Z_CHUNK, axis='z',
+                 coordinates=False, attrs=None):
+        if is_dataset(path):
+            raise FileExistsError(f"{path} already holds a dataset; use DatasetWriter.open")
+        os.makedirs(os.path.join(path, 'chunks'), exist_ok=True)
+        self.path = path
+        self.manifest = {
+            'format': FORMAT_NAME, 'version': FORMAT_VERSION, 'axis': axis,
+            'dtype': np.dtype(dtype).str, 'item_shape': [int(n) for n in item_shape],
+            'length': 0, 'chunk_size': int(chunk_size),
+            'coordinates': [] if coordinates else None, 'attrs': dict(attrs or {}), 'chunks': [],
+        }
+        self._buffer = []
+        self._buffered = 0
+        self._pending_coordinates = []
+        _write_manifest(path, self.manifest)
+
+    @classmethod
+    def open(cls, path):
+        """Continue appending to an existing dataset."""
+        writer = cls.__new__(cls)
+        writer.path = path
+        writer.manifest = read_manifest(path)
+        writer._buffer = []
+        writer._buffered = 0
+        writer._pending_coordinates = []
+        return writer
+
+    @property
+    def chunk_size(self):
+        return self.manifest['chunk_size']
+
+    @property
+    def item_shape(self):
+        return tuple(self.manifest['item_shape'])
+
+    def __len__(self):
+        return self.manifest['length'] + self._buffered
+
+    def append(self, rows, coordinates=None):
+        """
+        Append an (n, *item_shape) block of rows, or a single item. Datasets
+        created with coordinates=True need one coordinate per row.
+        """
+        rows = np.asarray(rows, dtype=self.manifest['dtype'])
+        if rows.shape == self.item_shape:
+            rows = rows[np.newaxis]
+        if rows.shape[1:] != self.item_shape:
+            raise ValueError(f"rows of shape {rows.shape[1:]} do not match {self.item_shape}")
+        if self.manifest['coordinates'] is not None:
+            coordinates = np.atleast_1d(np.asarray(coordinates, dtype=np.float64))
+            if coordinates.shape != (len(rows),):
+                raise ValueError("one coordinate is needed per appended row")
+            coordinates = coordinates.tolist()
+
+        while len(rows):
+            take = min(len(rows), self.chunk_size - self._buffered)
+            self._buffer.append(np.array(rows[:take]))
+            self._buffered += take
+            rows = rows[take:]
+            # Coordinates are buffered with their rows, so a flush records only those it writes
+            if self.manifest['coordinates'] is not None:
+                self._pending_coordinates.extend(coordinates[:take])
+                coordinates = coordinates[take:]
+            if self._buffered == self.chunk_size:
+                self.flush()
+
+    def flush(self):
+        """Write the buffered rows as a chunk, even if it is not full."""
+        if not self._buffered:
+            return
+        index = len(self.manifest['chunks'])
+        name = os.path.join('chunks', f"{index:06d}.npz")
+        target = os.path.join(self.path, name)
+        # np.savez_compressed appends .npz unless the name already ends in it
+        temporary = target[:-len('.npz')] + '.tmp.npz'
+        np.savez_compressed(temporary, data=np.concatenate(self._buffer))
+        os.replace(temporary, target)
+
+        start = self.manifest['length']
+        self.manifest['chunks'].append({'file': name, 'start': start, 'stop': start + self._buffered,
+                                        'bytes': os.path.getsize(target)})
+        self.manifest['length'] = start + self._buffered
+        if self.manifest['coordinates'] is not None:
+            self.manifest['coordinates'].extend(self._pending_coordinates)
+        self._buffer = []
+        self._buffered = 0
+        self._pending_coordinates = []
+        _write_manifest(self.path, self.manifest)
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_dataset(path, array, chunk_size=DEFAULT_Z_CHUNK, axis='z', coordinates=None, attrs=None):
+    """
+    Store an array (or memmap, or anything sliceable along its first axis)
+    as a chunked dataset, reading it one chunk at a time.
+    """
+    with DatasetWriter(path, array.shape[1:], array.dtype, chunk_size, axis,
+                       coordinates is not None, attrs) as writer:
+        for start, stop in iter_z_chunks(array.shape[0], chunk_size):
+            writer.append(np.asarray(array[start:stop]),
+                          None if coordinates is None else coordinates[start:stop])
+    return ChunkedDataset(path)
+
+
+def import_npy(npy_path, path, chunk_size=DEFAULT_Z_CHUNK, attrs=None):
+    """
+    Convert a .npy volume (for example a real CT scan) into a chunked
+    dataset through a memory map, so the source is never loaded whole.
+    """
+    source = np.load(npy_path, mmap_mode='r')
+    attrs = dict({'source': os.path.basename(npy_path)}, **(attrs or {}))
+    return write_dataset(path, source, chunk_size, attrs=attrs)
+
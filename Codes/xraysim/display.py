@@ -0,0 +1,127 @@
+import tkinter as tk
+
+import numpy as np
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.figure import Figure
+
+from .instrument import span
+
+
+class ImageView:
+    """
+    A persistent image display on a Tk canvas.
+
+    The AxesImage and title are created once and marked animated; updates
+    call set_data/set_clim and blit them over a cached background instead of
+    clearing the axes and redrawing the whole figure. Images smaller than
+    `shape` (coarse previews) are stretched over the same extent.
+    """
+
+    def __init__(self, ax, canvas, shape=None, cmap="gray", origin="lower"):
+        self.ax = ax
+        self.canvas = canvas
+        self.shape = shape
+        self.cmap = cmap
+        self.origin = origin
+        self.image = None
+        self.title = ax.set_title("", animated=True)
+        self.texts = []
+        self.overlay = ax.text(0.02, 0.02, "", transform=ax.transAxes, fontsize=7, color="yellow",
+                               family="monospace", verticalalignment="bottom", animated=True)
+        self._background = None
+        self.ax.axis('off')
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def _on_draw(self, event):
+        # A full redraw (first show, resize) refreshes the cached background
+        self._background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self._draw_animated()
+
+    def _draw_animated(self):
+        for artist in [self.image, self.title, self.overlay] + self.texts:
+            if artist is not None:
+                self.ax.draw_artist(artist)
+
+    def annotate(self, lines, color="black", fontsize=12, spacing=0.05):
+        """Set the text lines drawn in the top-left corner of the axes."""
+        while len(self.texts) < len(lines):
+            self.texts.append(self.ax.text(
+                0.05, 0.95 - spacing * len(self.texts), "", transform=self.ax.transAxes,
+                fontsize=fontsize, color=color, verticalalignment="top", animated=True))
+        for text, line in zip(self.texts, list(lines) + [""] * len(self.texts)):
+            text.set_text(line)
+
+    def set_overlay(self, text):
+        """Text drawn in the bottom-left corner (e.g. timings); '' hides it."""
+        self.overlay.set_text(text)
+
+    def show(self, image, title=None):
+        with span('ImageView.draw'):
+            self._show(image, title)
+
+    def _show(self, image, title):
+        if title is not None:
+            self.title.set_text(title)
+        if self.image is None:
+            rows, cols = self.shape or image.shape
+            self.image = self.ax.imshow(image, cmap=self.cmap, origin=self.origin, animated=True,
+                                        extent=(-0.5, cols - 0.5, -0.5, rows - 0.5))
+            self.canvas.draw()
+            return
+
+        self.image.set_data(image)
+        self.image.set_clim(np.min(image), np.max(image))
+        if self._background is None:
+            self.canvas.draw()
+            return
+        self.canvas.restore_region(self._background)
+        self._draw_animated()
+        self.canvas.blit(self.canvas.figure.bbox)
+
+
+def embed_figure(master, figsize):
+    """
+    Figure, axes and Tk canvas for `master`. The Figure is created directly
+    rather than through pyplot, so it is freed with its window instead of
+    staying in pyplot's figure registry.
+    """
+    fig = Figure(figsize=figsize)
+    ax = fig.add_subplot()
+    canvas = FigureCanvasTkAgg(fig, master=master)
+    return fig, ax, canvas
+
+
+class ImageWindow:
+    """
+    A reusable Toplevel showing one ImageView. Showing an image while the
+    window is open updates it in place; closing it releases the figure.
+    """
+
+    def __init__(self, root, title, figsize=(6, 6), text_color="black"):
+        self.root = root
+        self.window_title = title
+        self.figsize = figsize
+        self.text_color = text_color
+        self.window = None
+        self.view = None
+
+    def _open(self, shape):
+        self.window = tk.Toplevel(self.root)
+        self.window.title(self.window_title)
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        _, ax, canvas = embed_figure(self.window, self.figsize)
+        canvas.get_tk_widget().pack()
+        self.view = ImageView(ax, canvas, shape)
+
+    def show(self, image, title=None, lines=()):
+        if self.window is None or not self.window.winfo_exists():
+            self._open(image.shape)
+        self.view.annotate(lines, color=self.text_color)
+        self.view.show(image, title)
+        self.window.lift()
+
+    def close(self):
+        if self.window is not None:
+            self.window.destroy()
+        self.window = None
+        self.view = None
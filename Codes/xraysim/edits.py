@@ -0,0 +1,158 @@
+import dataclasses
+
+import numpy as np
+
+from .splits import angled_split_mask
+from .volume import DEFAULT_Z_CHUNK, iter_z_chunks
+
+
+@dataclasses.dataclass(frozen=True)
+class OrthogonalSplit:
+    """
+    Zero every voxel in the z-slab [z_start, z_end); negative bounds count
+    from the top, as in add_orthogonal_split.
+    """
+
+    z_start: int
+    z_end: int
+
+    def z_range(self, shape):
+        """Slices [start, end) of a volume of `shape` that the edit can change."""
+        start, end, _ = slice(self.z_start, self.z_end).indices(shape[0])
+        return start, max(start, end)
+
+    def apply(self, chunk, z_offset, shape):
+        start, end = self.z_range(shape)
+        start, end = max(start - z_offset, 0), min(end - z_offset, chunk.shape[0])
+        if start < end:
+            chunk[start:end] = 0
+
+
+@dataclasses.dataclass(frozen=True)
+class AngledSplit:
+    """Zero every voxel on or above the plane z = m*(x - x0) + n*(y - y0) + z0."""
+
+    m: float
+    n: float
+    x0: float
+    y0: float
+    z0: float
+
+    def _plane_range(self, shape):
+        # The plane is linear in x and y, so its extremes sit on the corners
+        corners = [self.m * (x - self.x0) + self.n * (y - self.y0) + self.z0
+                   for x in (0, shape[1] - 1) for y in (0, shape[2] - 1)]
+        return min(corners), max(corners)
+
+    def z_range(self, shape):
+        """Slices [start, end) of a volume of `shape` that the edit can change."""
+        lowest, _ = self._plane_range(shape)
+        return min(max(int(np.ceil(lowest)), 0), shape[0]), shape[0]
+
+    def apply(self, chunk, z_offset, shape):
+        lowest, highest = self._plane_range(chunk.shape)
+        if z_offset + chunk.shape[0] - 1 < lowest:
+            return  # Entire chunk is below the plane
+        if z_offset >= highest:
+            chunk[...] = 0  # Entire chunk is above the plane
+            return
+        chunk[angled_split_mask(chunk.shape, self.m, self.n, self.x0, self.y0, self.z0, z_offset)] = 0
+
+
+class EditedPhantom:
+    """
+    A phantom plus a stack of recorded split edits, applied lazily.
+
+    The base volume is never modified: indexing materializes only the
+    z-slices it touches and applies the edits to that copy. Many fracture
+    variants can therefore share one (read-only, cached) base volume, and
+    undo/redo only move edits between two lists.
+    """
+
+    def __init__(self, base, edits=()):
+        self.base = base
+        self._edits = list(edits)
+        self._undone = []
+
+    @property
+    def edits(self):
+        return tuple(self._edits)
+
+    @property
+    def materials(self):
+        return getattr(self.base, 'materials', None)
+
+    @property
+    def shape(self):
+        return self.base.shape
+
+    @property
+    def dtype(self):
+        return self.base.dtype
+
+    @property
+    def ndim(self):
+        return len(self.base.shape)
+
+    def __len__(self):
+        return self.base.shape[0]
+
+    def push(self, edit):
+        """Record a new edit; clears the redo history."""
+        self._edits.append(edit)
+        self._undone.clear()
+        return self
+
+    def undo(self):
+        """Remove the most recent edit and return it (None if there is none)."""
+        if not self._edits:
+            return None
+        edit = self._edits.pop()
+        self._undone.append(edit)
+        return edit
+
+    def redo(self):
+        """Re-apply the most recently undone edit and return it."""
+        if not self._undone:
+            return None
+        edit = self._undone.pop()
+        self._edits.append(edit)
+        return edit
+
+    def with_edit(self, edit):
+        """New variant sharing the same base volume, with one more edit."""
+        return EditedPhantom(self.base, self._edits + [edit])
+
+    def chunk(self, z_start, z_end):
+        """Edited copy of the slices [z_start, z_end)."""
+        chunk = np.array(self.base[z_start:z_end])
+        for edit in self._edits:
+            edit.apply(chunk, z_start, self.shape)
+        return chunk
+
+    def iter_chunks(self, chunk_size=DEFAULT_Z_CHUNK):
+        """Yield (z_start, z_end, chunk) over the whole edited volume."""
+        for z_start, z_end in iter_z_chunks(self.shape[0], chunk_size):
+            yield z_start, z_end, self.chunk(z_start, z_end)
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        z_key, rest = key[0], key[1:]
+
+        # Plain z indices and slices only materialize the slices they touch
+        if isinstance(z_key, (int, np.integer)):
+            z = range(self.shape[0])[z_key]
+            return self.chunk(z, z + 1)[(0,) + rest]
+        if isinstance(z_key, slice):
+            z_start, z_end, step = z_key.indices(self.shape[0])
+            if step > 0:
+                chunk = self.chunk(z_start, max(z_start, z_end))
+                return chunk[(slice(None, None, step),) + rest]
+        return np.asarray(self)[key]
+
+    def __array__(self, dtype=None, copy=None):
+        volume = np.empty(self.shape, dtype=self.dtype)
+        for z_start, z_end, chunk in self.iter_chunks():
+            volume[z_start:z_end] = chunk
+        return volume if dtype is None else volume.astype(dtype)
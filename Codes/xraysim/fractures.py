@@ -0,0 +1,254 @@
+import dataclasses
+
+import numpy as np
+from scipy import ndimage
+
+from .instrument import traced
+
+# Rows whose bone shadow falls below this fraction of its intact level are broken
+DEFAULT_LEVEL = 0.5
+
+# Percentile over z taken as the intact projection; rows lost to fractures lie below it
+REFERENCE_PERCENTILE = 90
+
+# Width in columns of the median filter separating the jumps at the bone edges
+# from the smooth tissue profile
+EDGE_FILTER_SIZE = 7
+
+
+@dataclasses.dataclass(frozen=True)
+class Fracture:
+    """
+    A break in the bone shadow of one projection.
+
+    z_start and z_end are the first missing and the first intact row at the
+    bone centre: z_start is 0 when the bone is lost from the bottom and
+    z_end the image height when it is lost to the top. slope is the rise of
+    the break edge in rows per detector column, tilt the same as an angle in
+    degrees (0 for a break square to the bone).
+    """
+
+    angle: float
+    z_start: float
+    z_end: float
+    column: float
+    slope: float
+
+    @property
+    def tilt(self):
+        return float(np.degrees(np.arctan(self.slope)))
+
+    @property
+    def width(self):
+        return self.z_end - self.z_start
+
+
+@dataclasses.dataclass(frozen=True)
+class ProjectionAnalysis:
+    """
+    Per-angle intermediate results: the bone shadow columns, the bone
+    shadow level of every row relative to the intact projection, and the
+    breaks found in it.
+    """
+
+    angle: float
+    bone_columns: tuple
+    level: np.ndarray
+    fractures: tuple
+
+
+def bone_band(reference):
+    """
+    First and last detector column of the bone shadow in each row of an
+    (n_angles, n_detectors) stack of intact profiles.
+
+    The bone edges are the strongest jumps of the profile gradient above its
+    median-filtered tissue trend, left and right of the leg centre, away
+    from the leg outline. When no jump stands clear of the noise the whole
+    leg is used.
+    """
+    n_angles, width = reference.shape
+    gradient = np.diff(reference, axis=1)
+    jumps = gradient - ndimage.median_filter(gradient, size=(1, EDGE_FILTER_SIZE))
+
+    leg = reference > 0.05 * reference.max(axis=1, keepdims=True)
+    first = leg.argmax(axis=1)
+    last = width - 1 - leg[:, ::-1].argmax(axis=1)
+    centre = (first + last) / 2
+    margin = np.maximum(3, 0.1 * (last - first))
+
+    # Gradient sample i lies between columns i and i + 1
+    positions = np.arange(width - 1)[np.newaxis, :] + 0.5
+    left_side = (positions > (first + margin)[:, np.newaxis]) & (positions < centre[:, np.newaxis])
+    right_side = (positions < (last - margin)[:, np.newaxis]) & (positions > centre[:, np.newaxis])
+    left = np.where(left_side, jumps, -np.inf).argmax(axis=1)
+    right = np.where(right_side, jumps, np.inf).argmin(axis=1)
+
+    rows = np.arange(n_angles)
+    noise = np.median(np.abs(jumps), axis=1) + 1e-12
+    found = (jumps[rows, left] > 4 * noise) & (-jumps[rows, right] > 4 * noise) & (left < right)
+    return np.where(found, left + 1, first), np.where(found, right, last)
+
+
+def _edge_rows(values, level):
+    """
+    Row (fractional) at which each column of a (rows, columns) window first
+    falls from >= level to below it, or NaN.
+    """
+    above = values >= level
+    crossing = above[:-1] & ~above[1:]
+    index = crossing.argmax(axis=0)
+    columns = np.arange(values.shape[1])
+    before, after = values[index, columns], values[index + 1, columns]
+    rows = index + (before - level) / (before - after)
+    return np.where(crossing.any(axis=0), rows, np.nan)
+
+
+def _fit_edge(values, level, row_offset, columns, centre, upward):
+    # Line through the per-column crossings; rows are counted up from row_offset
+    if upward:
+        rows = row_offset + _edge_rows(values, level)
+    else:
+        rows = row_offset + values.shape[0] - 1 - _edge_rows(values[::-1], level)
+    valid = np.isfinite(rows)
+    if valid.sum() < 2:
+        return np.nan, 0.0
+    slope, intercept = np.polyfit(columns[valid] - centre, rows[valid], 1)
+    # Crossings lie between rows; +0.5 gives the first row past the edge
+    return intercept + 0.5, slope
+
+
+def _breaks(angle, normalized, level_profile, left, right, level):
+    height = normalized.shape[0]
+    columns = np.arange(left, right + 1, dtype=np.float64)
+    centre = (left + right) / 2
+    window = right - left + 2
+    runs, _ = ndimage.label(level_profile < level)
+
+    fractures = []
+    for start, end in ((run.start, run.stop) for (run,) in ndimage.find_objects(runs)):
+        middle = (start + end) // 2
+        slopes = []
+        if start > 0:
+            low = max(0, start - window)
+            z_start, slope = _fit_edge(normalized[low:max(middle, start + 1)], level, low,
+                                       columns, centre, upward=True)
+            slopes.append(slope)
+        else:
+            z_start = 0.0
+        if end < height:
+            high = min(height, end + window)
+            z_end, slope = _fit_edge(normalized[min(middle, end - 1):high], level,
+                                     min(middle, end - 1), columns, centre, upward=False)
+            slopes.append(slope)
+        else:
+            z_end = float(height)
+        fractures.append(Fracture(float(angle), float(z_start), float(z_end), float(centre),
+                                  float(slopes[0]) if slopes else 0.0))
+    return tuple(fractures)
+
+
+@traced('analyze_projections')
+def analyze_projections(projections, angles, level=DEFAULT_LEVEL, transmission=False):
+    """
+    Find breaks in the bone shadow of a (n_angles, height, n_detectors)
+    stack of side projections, such as forward_project produces. Returns
+    one ProjectionAnalysis per angle.
+
+    Projections are line integrals; with transmission=True they are
+    intensities and are log-transformed first. The intact projection of
+    each angle is a high percentile over z, so at least a tenth of the rows
+    must be intact. Rows whose mean bone shadow drops below `level` of it
+    form a break, and the edges of every break are located to a fraction of
+    a row in each bone column and fitted with a line for their tilt.
+    """
+    projections = np.asarray(projections, dtype=np.float64)
+    if transmission:
+        projections = -np.log(np.clip(projections, 1e-12, None))
+
+    reference = np.percentile(projections, REFERENCE_PERCENTILE, axis=1)
+    lefts, rights = bone_band(reference)
+
+    # Projections relative to the intact profile, 1 where nothing is missing
+    normalized = np.zeros_like(projections)
+    np.divide(projections, reference[:, np.newaxis, :], out=normalized,
+              where=reference[:, np.newaxis, :] > 0)
+    columns = np.arange(projections.shape[2])[np.newaxis, :]
+    in_band = (columns >= lefts[:, np.newaxis]) & (columns <= rights[:, np.newaxis])
+    levels = (normalized * in_band[:, np.newaxis, :]).sum(axis=2) / in_band.sum(axis=1)[:, np.newaxis]
+
+    analyses = []
+    for angle, image, profile, left, right in zip(angles, normalized, levels, lefts, rights):
+        band = image[:, left:right + 1]
+        analyses.append(ProjectionAnalysis(
+            float(angle), (int(left), int(right)), profile,
+            _breaks(angle, band, profile, int(left), int(right), level)))
+    return analyses
+
+
+def fit_fracture_plane(fractures):
+    """
+    Slopes (m, n) of a planar fracture z = m*x + n*y + c in the phantom's
+    (x, y) voxel axes, fitted to the edge slopes of one break seen at two
+    or more projection angles. At angle theta the plane appears with slope
+    -m*sin(theta) + n*cos(theta) along the detector.
+    """
+    fractures = list(fractures)
+    if len(fractures) < 2:
+        raise ValueError("a fracture plane needs breaks seen at two or more angles")
+    theta = np.deg2rad([fracture.angle for fracture in fractures])
+    system = np.stack([-np.sin(theta), np.cos(theta)], axis=1)
+    (m, n), *_ = np.linalg.lstsq(system, [fracture.slope for fracture in fractures], rcond=None)
+    return float(m), float(n)
+
+
+class FractureDetector:
+    """
+    Fracture detection over a growing set of projection angles of one
+    phantom.
+
+    Every angle is analysed once and its ProjectionAnalysis cached, so
+    adding angles only processes the new projections; the plane fit is
+    redone from the cached edge slopes.
+    """
+
+    def __init__(self, level=DEFAULT_LEVEL, transmission=False):
+        self.level = level
+        self.transmission = transmission
+        self._analyses = {}
+
+    def update(self, projections, angles):
+        """
+        Analyse the projections of angles not seen before and return the
+        analyses of all the given angles, in order.
+        """
+        angles = [float(angle) for angle in angles]
+        new = [index for index, angle in enumerate(angles) if angle not in self._analyses]
+        if new:
+            stack = np.asarray(projections)[new]
+            for analysis in analyze_projections(stack, [angles[index] for index in new],
+                                                self.level, self.transmission):
+                self._analyses[analysis.angle] = analysis
+        return [self._analyses[angle] for angle in angles]
+
+    @property
+    def angles(self):
+        return sorted(self._analyses)
+
+    def fractures(self):
+        """Every break found so far, ordered by angle and height."""
+        return [fracture for angle in self.angles for fracture in self._analyses[angle].fractures]
+
+    def plane(self):
+        """
+        fit_fracture_plane of the lowest break at every angle that shows one,
+        or None with fewer than two such angles.
+        """
+        lowest = [analysis.fractures[0] for analysis in map(self._analyses.get, self.angles)
+                  if analysis.fractures]
+        if len(lowest) < 2:
+            return None
+        return fit_fracture_plane(lowest)
+
+    def clear(self):
+        self._analyses.clear()
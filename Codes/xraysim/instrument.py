@@ -0,0 +1,174 @@
+import atexit
+import collections
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+# Most recent spans kept by a tracer; older ones are dropped
+DEFAULT_MAX_EVENTS = 100_000
+
+
+class _NullSpan:
+    """Shared do-nothing span returned while tracing is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.memory = tracemalloc.get_traced_memory()[0] if self.tracer.track_allocations else None
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter_ns()
+        args = dict(self.args)
+        if self.memory is not None and tracemalloc.is_tracing():
+            args['allocated_bytes'] = tracemalloc.get_traced_memory()[0] - self.memory
+        self.tracer.events.append(
+            (self.name, self.start, end - self.start, threading.get_ident(), args))
+        return False
+
+
+class Tracer:
+    """
+    Collects timed spans of the simulation pipeline.
+
+    Disabled by default: span() then returns a shared no-op context manager
+    and traced functions make a single flag check, so instrumented code runs
+    at full speed. When enabled, every span records its wall time and thread,
+    and optionally the net memory it allocated (tracemalloc) and a cProfile
+    capture of the whole session. Events export to the Chrome trace format
+    (chrome://tracing, Perfetto).
+    """
+
+    def __init__(self, max_events=DEFAULT_MAX_EVENTS):
+        self.enabled = False
+        self.track_allocations = False
+        self.events = collections.deque(maxlen=max_events)
+        self.profiler = None
+        self._origin = time.perf_counter_ns()
+        self._started_tracemalloc = False
+
+    def enable(self, allocations=False, profile=False):
+        if allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self.track_allocations = allocations
+        if profile and self.profiler is None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        self.track_allocations = False
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        if self.profiler is not None:
+            self.profiler.disable()
+
+    def clear(self):
+        self.events.clear()
+        self.profiler = None
+
+    def span(self, name, **args):
+        """Context manager timing the enclosed block as `name`."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def summary(self):
+        """
+        Per-span statistics: count, total/mean/last duration in ms and the
+        total net allocation in bytes (when allocations are tracked).
+        """
+        stats = {}
+        for name, _, duration, _, args in list(self.events):
+            entry = stats.setdefault(name, {'count': 0, 'total_ms': 0.0, 'last_ms': 0.0,
+                                            'allocated_bytes': 0})
+            entry['count'] += 1
+            entry['total_ms'] += duration / 1e6
+            entry['last_ms'] = duration / 1e6
+            entry['allocated_bytes'] += args.get('allocated_bytes', 0)
+        for entry in stats.values():
+            entry['mean_ms'] = entry['total_ms'] / entry['count']
+        return stats
+
+    def format_summary(self):
+        """One line per span name with the last and mean duration, for overlays."""
+        return "\n".join(
+            f"{name}: {entry['last_ms']:.1f} ms (mean {entry['mean_ms']:.1f}, n={entry['count']})"
+            for name, entry in sorted(self.summary().items()))
+
+    def chrome_trace(self):
+        """The recorded spans as a Chrome trace event dictionary."""
+        pid = os.getpid()
+        return {'traceEvents': [
+            {'name': name, 'ph': 'X', 'pid': pid, 'tid': thread,
+             'ts': (start - self._origin) / 1e3, 'dur': duration / 1e3, 'args': args}
+            for name, start, duration, thread, args in list(self.events)
+        ], 'displayTimeUnit': 'ms'}
+
+    def export_chrome_trace(self, path):
+        with open(path, 'w') as handle:
+            json.dump(self.chrome_trace(), handle)
+
+    def profile_stats(self, sort='cumulative', limit=30):
+        """cProfile report of the session as text ('' without profile=True)."""
+        if self.profiler is None:
+            return ''
+        stream = io.StringIO()
+        pstats.Stats(self.profiler, stream=stream).sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+# Process-wide tracer used by the instrumented package functions
+TRACER = Tracer()
+span = TRACER.span
+
+
+def traced(name):
+    """Decorator timing every call of the function as span `name`."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return func(*args, **kwargs)
+            with TRACER.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def enable_from_environment():
+    """
+    Start tracing when XRAYSIM_TRACE names an output file; the Chrome trace
+    is written there when the process exits. XRAYSIM_TRACE_ALLOCATIONS=1
+    also tracks allocations. Called by the command line and the scripts'
+    entry points, never on import.
+    """
+    path = os.environ.get('XRAYSIM_TRACE')
+    if not path or TRACER.enabled:
+        return
+    TRACER.enable(allocations=os.environ.get('XRAYSIM_TRACE_ALLOCATIONS') == '1')
+    atexit.register(TRACER.export_chrome_trace, path)
@@ -0,0 +1,161 @@
+import dataclasses
+import hashlib
+import os
+import time
+
+import numpy as np
+from scipy import sparse
+
+from .sinogram import ParallelBeamGeometry, system_matrix
+
+# On-disk cache for assembled system matrices, one .npz file per geometry.
+# Separate from the simulated-image cache (XRAYSIM_IMAGE_CACHE_DIR, see
+# cache.py), which is off by default
+DEFAULT_CACHE_DIR = os.environ.get(
+    'XRAYSIM_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'xraysim'))
+
+# Part of every cached matrix's key; bump it whenever the projector weights
+# change so matrices assembled by older code are not reused
+SYSTEM_MATRIX_VERSION = 1
+
+
+def geometry_key(geometry):
+    """Stable file-name key for a geometry and the projector version."""
+    return hashlib.sha1(repr((SYSTEM_MATRIX_VERSION, geometry)).encode()).hexdigest()[:16]
+
+
+def load_system_matrix(geometry, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Return the CSR system matrix for a geometry, reading it from `cache_dir`
+    when it was assembled before and saving it there otherwise. Pass
+    cache_dir=None to keep the matrix in memory only.
+    """
+    if cache_dir is None:
+        return system_matrix(geometry)
+
+    path = os.path.join(cache_dir, f"system_matrix_{geometry_key(geometry)}.npz")
+    if os.path.exists(path):
+        return sparse.load_npz(path).tocsr()
+
+    matrix = system_matrix(geometry)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write under a temporary name so concurrent readers never see half a file
+    temporary = f"{path}.{os.getpid()}.tmp.npz"
+    sparse.save_npz(temporary, matrix)
+    os.replace(temporary, path)
+    return matrix
+
+
+@dataclasses.dataclass
+class IterativeResult:
+    """Reconstructed volume plus per-iteration diagnostics."""
+
+    volume: np.ndarray
+    residuals: list
+    times: list
+    converged: bool
+
+    @property
+    def iterations(self):
+        return len(self.residuals)
+
+
+class _OrderedSubsets:
+    """
+    Row blocks of the system matrix, one per subset of interleaved angles,
+    with their row and column sums precomputed.
+    """
+
+    def __init__(self, matrix, geometry, n_subsets):
+        n_detectors = geometry.n_detectors
+        self.rows = []
+        self.matrices = []
+        self.row_sums = []
+        self.column_sums = []
+        for subset in range(n_subsets):
+            angles = np.arange(subset, geometry.n_angles, n_subsets)
+            rows = (angles[:, np.newaxis] * n_detectors + np.arange(n_detectors)).ravel()
+            block = matrix[rows]
+            self.rows.append(rows)
+            self.matrices.append(block)
+            self.row_sums.append(np.asarray(block.sum(axis=1), dtype=np.float32))
+            self.column_sums.append(np.asarray(block.sum(axis=0), dtype=np.float32).T)
+
+    def __iter__(self):
+        return iter(zip(self.rows, self.matrices, self.row_sums, self.column_sums))
+
+
+def _safe_divide(numerator, denominator):
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+
+
+def _reconstruct(update, sinogram, angles, shape, n_subsets, tol, max_iterations,
+                 initial, cache_dir, callback):
+    n_angles, height, n_detectors = np.shape(sinogram)
+    if shape is None:
+        shape = (n_detectors, n_detectors)
+    geometry = ParallelBeamGeometry(tuple(shape), tuple(float(a) for a in angles), n_detectors)
+    if geometry.n_angles != n_angles:
+        raise ValueError("sinogram and angles disagree on the number of projections")
+
+    matrix = load_system_matrix(geometry, cache_dir)
+    subsets = _OrderedSubsets(matrix, geometry, min(n_subsets, n_angles))
+
+    # Every slice is one column, so all z-slices are updated together
+    measured = np.asarray(sinogram, dtype=np.float32).transpose(0, 2, 1).reshape(-1, height)
+    measured_norm = np.linalg.norm(measured) or 1.0
+    volume = np.full((matrix.shape[1], height), initial, dtype=np.float32)
+
+    residuals, times = [], []
+    converged = False
+    for iteration in range(max_iterations):
+        start = time.perf_counter()
+        for rows, block, row_sums, column_sums in subsets:
+            update(volume, block, measured[rows], row_sums, column_sums)
+
+        residual = np.linalg.norm(measured - matrix @ volume) / measured_norm
+        residuals.append(float(residual))
+        times.append(time.perf_counter() - start)
+        if callback is not None:
+            callback(iteration, residuals[-1], times[-1])
+        if residual <= tol:
+            converged = True
+            break
+
+    volume = volume.T.reshape(height, *shape)
+    return IterativeResult(volume, residuals, times, converged)
+
+
+def sart(sinogram, angles, shape=None, n_subsets=10, relaxation=1.0, tol=1e-2,
+         max_iterations=50, nonnegative=True, cache_dir=DEFAULT_CACHE_DIR, callback=None):
+    """
+    Ordered-subset SART reconstruction of an (n_angles, height, n_detectors)
+    sinogram from forward_project.
+
+    Iterates until the relative projection residual drops to `tol` (or
+    `max_iterations` is reached); callback(iteration, residual, seconds) is
+    called after every full pass over the subsets.
+    """
+    def update(volume, block, measured, row_sums, column_sums):
+        correction = _safe_divide(measured - block @ volume, row_sums)
+        volume += relaxation * _safe_divide(block.T @ correction, column_sums)
+        if nonnegative:
+            np.maximum(volume, 0, out=volume)
+
+    return _reconstruct(update, sinogram, angles, shape, n_subsets, tol, max_iterations,
+                        0.0, cache_dir, callback)
+
+
+def osem(sinogram, angles, shape=None, n_subsets=10, tol=1e-2, max_iterations=50,
+         cache_dir=DEFAULT_CACHE_DIR, callback=None):
+    """
+    Ordered-subset expectation maximisation (OS-EM) reconstruction. Takes the
+    same arguments as sart; the multiplicative update keeps the volume
+    non-negative.
+    """
+    def update(volume, block, measured, row_sums, column_sums):
+        ratio = _safe_divide(measured, block @ volume)
+        volume *= _safe_divide(block.T @ ratio, column_sums)
+
+    return _reconstruct(update, sinogram, angles, shape, n_subsets, tol, max_iterations,
+                        1.0, cache_dir, callback)
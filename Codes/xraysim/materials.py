@@ -0,0 +1,99 @@
+import dataclasses
+
+import numpy as np
+
+# Phantom label values
+AIR = 0
+SOFT_TISSUE = 1
+BONE = 2
+
+
+@dataclasses.dataclass(frozen=True)
+class Material:
+    """
+    A phantom material: its name, density (g/cm^3) and attenuation per voxel
+    tabulated against beam energy (keV). Attenuation is linearly interpolated
+    between the tabulated energies and clamped outside them; tables of
+    measured coefficients, which follow power laws, set log_interpolation to
+    interpolate in log-log space instead.
+    """
+
+    name: str
+    density: float
+    energies: tuple
+    mu: tuple
+    log_interpolation: bool = False
+
+    def attenuation(self, beam_energy):
+        if self.log_interpolation:
+            return np.exp(np.interp(np.log(beam_energy), np.log(self.energies), np.log(self.mu)))
+        return np.interp(beam_energy, self.energies, self.mu)
+
+
+class MaterialTable:
+    """
+    Maps the integer labels stored in a phantom to materials. Labels without
+    an entry behave like air.
+    """
+
+    def __init__(self, materials):
+        self.materials = dict(materials)
+
+    def __getitem__(self, label):
+        return self.materials[label]
+
+    def __iter__(self):
+        return iter(sorted(self.materials.items()))
+
+    @property
+    def labels(self):
+        return tuple(sorted(self.materials))
+
+    def attenuation_lut(self, beam_energy, dtype=np.float32):
+        """
+        Label -> attenuation lookup table for one beam energy.
+        """
+        lut = np.zeros(max(self.materials) + 1, dtype=dtype)
+        for label, material in self.materials.items():
+            lut[label] = material.attenuation(beam_energy)
+        return lut
+
+    def attenuation_matrix(self, energies, labels, dtype=np.float32):
+        """
+        (n_energies, n_labels) matrix of attenuation coefficients, one row
+        per energy bin.
+        """
+        energies = np.asarray(energies, dtype=np.float64)
+        columns = [self.materials[label].attenuation(energies) if label in self.materials
+                   else np.zeros_like(energies) for label in labels]
+        return np.stack(columns, axis=1).astype(dtype)
+
+
+# The simulator's original linear attenuation model, tabulated from 0 to 1000 keV:
+#   bone   = 0.5 + (beam_energy / 100) * 0.5
+#   tissue = 0.2 + (beam_energy / 100) * 0.3
+DEFAULT_MATERIALS = MaterialTable({
+    AIR: Material('air', 0.0012, (0.0, 1000.0), (0.0, 0.0)),
+    SOFT_TISSUE: Material('soft tissue', 1.06, (0.0, 1000.0), (0.2, 3.2)),
+    BONE: Material('bone', 1.92, (0.0, 1000.0), (0.5, 5.5)),
+})
+
+
+# Linear attenuation coefficients in 1/cm (NIST mass attenuation coefficients
+# times density) for ICRU-44 soft tissue and cortical bone, used by the
+# polychromatic simulation
+_NIST_ENERGIES = (10.0, 15.0, 20.0, 30.0, 40.0, 50.0, 60.0, 80.0, 100.0, 150.0)
+PHYSICAL_MATERIALS = MaterialTable({
+    AIR: Material(
+        'air', 0.0012, _NIST_ENERGIES,
+        tuple(0.0012 * mu for mu in (5.12, 1.61, 0.778, 0.354, 0.268, 0.235, 0.218, 0.199, 0.186, 0.164)),
+        log_interpolation=True),
+    SOFT_TISSUE: Material(
+        'soft tissue', 1.06, _NIST_ENERGIES,
+        tuple(1.06 * mu for mu in (5.33, 1.66, 0.797, 0.372, 0.267, 0.228, 0.207, 0.186, 0.172, 0.151)),
+        log_interpolation=True),
+    BONE: Material(
+        'bone', 1.92, _NIST_ENERGIES,
+        tuple(1.92 * mu for mu in (28.5, 9.03, 4.00, 1.33, 0.666, 0.424, 0.315, 0.223, 0.186, 0.148)),
+        log_interpolation=True),
+})
@@ -0,0 +1,278 @@
+import csv
+
+import numpy as np
+from scipy import ndimage
+
+from .materials import AIR, BONE, SOFT_TISSUE
+from .projection import label_indices
+from .sinogram import forward_project
+from .volume import DEFAULT_Z_CHUNK, iter_z_chunks
+
+# Half-width in pixels of the band around the bone edge used for the edge
+# spread function; profiles are binned one pixel wide
+EDGE_RADIUS = 8
+
+# Columns of the quality tables, after any caller-supplied columns
+METRIC_FIELDS = ('bone_pixels', 'tissue_pixels', 'bone_mean', 'tissue_mean', 'tissue_std',
+                 'contrast', 'cnr', 'snr', 'mtf50', 'edge_width')
+
+
+def calculate_contrast(phantom_slice):
+    """
+    Absolute difference between the mean bone and mean soft-tissue values of
+    a slice, or 0 when either is missing. Accepts float slices as well as
+    uint8 label slices taken from a LabelPhantom.
+    """
+    phantom_slice = np.asarray(phantom_slice)
+    labels = label_indices(phantom_slice)
+    counts = np.bincount(labels.ravel(), minlength=BONE + 1)
+    if counts[BONE] == 0 or counts[SOFT_TISSUE] == 0:
+        return 0
+    sums = np.bincount(labels.ravel(), phantom_slice.ravel(), minlength=BONE + 1)
+    return np.abs(sums[BONE] / counts[BONE] - sums[SOFT_TISSUE] / counts[SOFT_TISSUE])
+
+
+def signed_edge_distance(labels, label=BONE):
+    """
+    Distance in pixels of every pixel of a (n, rows, cols) label stack to the
+    boundary of `label` in its own image: negative inside, positive outside,
+    with the boundary half a pixel from the nearest pixel centres. Images
+    without a boundary are +inf everywhere.
+    """
+    distances = np.full(labels.shape, np.inf)
+    for distance, mask in zip(distances, labels == label):
+        if mask.any() and not mask.all():
+            distance[...] = np.where(mask, 0.5 - ndimage.distance_transform_edt(mask),
+                                     ndimage.distance_transform_edt(~mask) - 0.5)
+    return distances
+
+
+def _divide(numerator, denominator):
+    # Elementwise ratio, NaN where the denominator is zero
+    result = np.full(np.broadcast(numerator, denominator).shape, np.nan)
+    np.divide(numerator, denominator, out=result, where=denominator != 0)
+    return result
+
+
+def _first_crossing(curves, level, x):
+    """
+    Position along x where each row first falls from >= level to below it,
+    linearly interpolated; NaN for rows that never cross or contain NaN.
+    """
+    above = curves >= level
+    crossing = above[:, :-1] & ~above[:, 1:]
+    found = crossing.any(axis=1) & ~np.isnan(curves).any(axis=1)
+    index = crossing.argmax(axis=1)
+    rows = np.arange(len(curves))
+    before, after = curves[rows, index], curves[rows, index + 1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraction = (before - level) / (before - after)
+    result = x[index] + fraction * (x[index + 1] - x[index])
+    result[~found] = np.nan
+    return result
+
+
+def _extend_profiles(profiles):
+    """
+    Fill empty bins of edge profiles with the nearest measured bin on the
+    edge side: bone thinner than the band (or a thin tissue rim) leaves the
+    outer bins empty, and repeating the last plateau value is the same as
+    clamping the band to the extent that exists. Rows with no edge stay NaN.
+    """
+    n_bins = profiles.shape[1]
+    positions = np.arange(n_bins)
+    valid = ~np.isnan(profiles)
+    previous = np.maximum.accumulate(np.where(valid, positions, 0), axis=1)
+    following = np.minimum.accumulate(np.where(valid, positions, n_bins - 1)[:, ::-1], axis=1)[:, ::-1]
+    nearest = np.where(positions < n_bins // 2, following, previous)
+    return np.take_along_axis(profiles, nearest, axis=1)
+
+
+def edge_metrics(profiles):
+    """
+    MTF50 (cycles per pixel) and 10-90 % edge width (pixels) from edge spread
+    functions sampled at one-pixel bins running from inside the bone
+    outwards, one row per image. Edges whose MTF stays above 0.5 report the
+    Nyquist frequency, 0.5.
+    """
+    n_bins = profiles.shape[1]
+    centres = np.arange(n_bins) - n_bins / 2 + 0.5
+
+    # Normalised so the bone side is 1 and the surroundings 0, whichever is brighter
+    normalised = _divide(profiles - profiles[:, -1:], profiles[:, :1] - profiles[:, -1:])
+    edge_width = _first_crossing(normalised, 0.1, centres) - _first_crossing(normalised, 0.9, centres)
+
+    line_spread = np.diff(profiles, axis=1)
+    mtf = np.abs(np.fft.rfft(line_spread, axis=1))
+    mtf = _divide(mtf, mtf[:, :1])
+    frequencies = np.fft.rfftfreq(n_bins - 1)
+    mtf50 = _first_crossing(mtf, 0.5, frequencies)
+    mtf50[np.isnan(mtf50) & (mtf >= 0.5).all(axis=1)] = 0.5
+    return mtf50, edge_width
+
+
+class QualityMasks:
+    """
+    Label masks of a stack of images, prepared once for image quality
+    measurements.
+
+    Every pixel gets a flat key combining its image index with its label,
+    and another with its distance bin from the bone edge, so the per-image,
+    per-region sums needed by all metrics come out of a few np.bincount
+    calls over the whole stack instead of boolean-index copies per image.
+    Any images of the same geometry (different beam energies, noise
+    realisations, reconstructions) can then be measured in one pass each.
+    """
+
+    def __init__(self, labels, radius=EDGE_RADIUS):
+        labels = label_indices(labels)
+        if labels.ndim == 2:
+            labels = labels[np.newaxis]
+        self.shape = labels.shape
+        self.radius = radius
+        self.n_labels = max(int(labels.max(initial=0)), BONE) + 1
+        n_images = labels.shape[0]
+        offsets = np.arange(n_images)[:, np.newaxis, np.newaxis]
+
+        self.label_keys = (offsets * self.n_labels + labels).ravel()
+        self.label_counts = np.bincount(
+            self.label_keys, minlength=n_images * self.n_labels).reshape(n_images, self.n_labels)
+
+        # Pixels of the leg within `radius` of the bone edge; the rest go to
+        # an overflow bin that is dropped
+        n_bins = 2 * radius
+        bins = np.floor(np.clip(signed_edge_distance(labels), -radius - 1, radius) + radius)
+        bins = bins.astype(np.intp)
+        bins[(bins < 0) | (labels == AIR)] = n_bins
+        self.edge_keys = (offsets * (n_bins + 1) + bins).ravel()
+        self.edge_counts = np.bincount(
+            self.edge_keys, minlength=n_images * (n_bins + 1)).reshape(n_images, n_bins + 1)[:, :n_bins]
+
+    @classmethod
+    def from_path_lengths(cls, path_lengths, radius=EDGE_RADIUS):
+        """Masks for projections, from one PathLengthMap per image."""
+        return cls(np.stack([projection_labels(maps) for maps in path_lengths]), radius)
+
+    def _sums(self, keys, values, width):
+        return np.bincount(keys, values, minlength=self.shape[0] * width).reshape(self.shape[0], width)
+
+    def measure(self, images, **columns):
+        """
+        Quality table of an image stack matching the masks: a dict of
+        equal-length columns, one row per image. Extra keyword columns (for
+        example z=..., angle=... or beam_energy=...) are broadcast to every
+        row and come first.
+
+        Contrast is |mean bone - mean tissue| (0 when either is missing),
+        noise is the standard deviation of the tissue region, CNR is
+        contrast / noise and SNR is mean tissue / noise; both are NaN for
+        noise-free images.
+        """
+        values = np.asarray(images, dtype=np.float64).reshape(self.shape).ravel()
+        counts = self.label_counts
+        means = _divide(self._sums(self.label_keys, values, self.n_labels), counts)
+        # Centred second moment, so flat regions give exactly zero noise
+        deviations = values - np.nan_to_num(means).ravel()[self.label_keys]
+        stds = np.sqrt(_divide(self._sums(self.label_keys, deviations * deviations, self.n_labels), counts))
+
+        n_bins = 2 * self.radius
+        profiles = _divide(self._sums(self.edge_keys, values, n_bins + 1)[:, :n_bins], self.edge_counts)
+        profiles = _extend_profiles(profiles)
+        mtf50, edge_width = edge_metrics(profiles)
+
+        bone_mean, tissue_mean, tissue_std = means[:, BONE], means[:, SOFT_TISSUE], stds[:, SOFT_TISSUE]
+        present = (counts[:, BONE] > 0) & (counts[:, SOFT_TISSUE] > 0)
+        contrast = np.where(present, np.abs(bone_mean - tissue_mean), 0.0)
+
+        n_images = self.shape[0]
+        table = {name: np.broadcast_to(np.asarray(value), (n_images,)).copy()
+                 for name, value in columns.items()}
+        table.update({
+            'bone_pixels': counts[:, BONE], 'tissue_pixels': counts[:, SOFT_TISSUE],
+            'bone_mean': bone_mean, 'tissue_mean': tissue_mean, 'tissue_std': tissue_std,
+            'contrast': contrast, 'cnr': _divide(contrast, tissue_std),
+            'snr': _divide(tissue_mean, tissue_std), 'mtf50': mtf50, 'edge_width': edge_width,
+        })
+        return table
+
+
+def projection_labels(path_lengths):
+    """
+    Label image of a projection: bone wherever a ray crosses bone, soft
+    tissue where it crosses only tissue, air elsewhere.
+    """
+    labels = np.zeros(path_lengths.shape, dtype=np.uint8)
+    labels[path_lengths.counts[path_lengths.labels.index(SOFT_TISSUE)] > 0] = SOFT_TISSUE
+    labels[path_lengths.counts[path_lengths.labels.index(BONE)] > 0] = BONE
+    return labels
+
+
+def sinogram_labels(phantom, angles):
+    """
+    Label images matching forward_project(phantom, angles), the side views
+    of the phantom: bone wherever a ray crosses bone, soft tissue where it
+    crosses only tissue, air elsewhere.
+    """
+    phantom = label_indices(np.asarray(phantom))
+    tissue = forward_project((phantom == SOFT_TISSUE).astype(np.uint8), angles) > 0
+    bone = forward_project((phantom == BONE).astype(np.uint8), angles) > 0
+    labels = np.zeros(bone.shape, dtype=np.uint8)
+    labels[tissue] = SOFT_TISSUE
+    labels[bone] = BONE
+    return labels
+
+
+def volume_quality(volume, labels=None, chunk_size=DEFAULT_Z_CHUNK, radius=EDGE_RADIUS):
+    """
+    Quality table of every z-slice of a volume (a phantom, a reconstruction
+    or a memory-mapped scan), read one z-chunk at a time. `labels` is the
+    label volume defining the regions; by default the volume is its own
+    label volume.
+    """
+    if labels is None:
+        labels = volume
+    tables = []
+    for z_start, z_end in iter_z_chunks(volume.shape[0], chunk_size):
+        masks = QualityMasks(np.asarray(labels[z_start:z_end]), radius)
+        tables.append(masks.measure(volume[z_start:z_end], z=np.arange(z_start, z_end)))
+    return concatenate_tables(tables)
+
+
+def projection_quality(images, path_lengths, angles, radius=EDGE_RADIUS, **columns):
+    """
+    Quality table of a projection stack, one row per angle, with regions
+    taken from the matching PathLengthMaps.
+    """
+    masks = QualityMasks.from_path_lengths(path_lengths, radius)
+    return masks.measure(images, angle=np.asarray(angles, dtype=np.float64), **columns)
+
+
+def sinogram_quality(sinogram, phantom, angles, radius=EDGE_RADIUS, **columns):
+    """
+    Quality table of a forward_project stack, one row per angle, with
+    regions from sinogram_labels.
+    """
+    masks = QualityMasks(sinogram_labels(phantom, angles), radius)
+    return masks.measure(sinogram, angle=np.asarray(angles, dtype=np.float64), **columns)
+
+
+def concatenate_tables(tables):
+    """Stack quality tables with the same columns into one."""
+    tables = list(tables)
+    if not tables:
+        return {}
+    return {name: np.concatenate([table[name] for table in tables]) for name in tables[0]}
+
+
+def table_rows(table):
+    """The rows of a quality table as dicts of Python scalars."""
+    names = list(table)
+    return [dict(zip(names, row)) for row in zip(*(table[name].tolist() for name in names))]
+
+
+def write_table(table, path):
+    """Write a quality table to a CSV file."""
+    with open(path, 'w', newline='') as handle:
+        writer = csv.DictWriter(handle, fieldnames=list(table))
+        writer.writeheader()
+        writer.writerows(table_rows(table))
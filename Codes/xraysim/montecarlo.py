@@ -0,0 +1,332 @@
+import dataclasses
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .conebeam import DEFAULT_VOXEL_SIZE
+from .materials import AIR, BONE, PHYSICAL_MATERIALS, SOFT_TISSUE
+from .projection import label_indices
+from .spectrum import kvp_spectrum
+from .volume import SharedVolume
+
+# Electron rest energy (keV) and classical electron radius (cm)
+ELECTRON_ENERGY = 510.999
+ELECTRON_RADIUS = 2.8179403e-13
+AVOGADRO = 6.02214076e23
+
+# Electrons per nucleon (Z/A) of each material, for the Compton cross-section
+ELECTRON_FRACTIONS = {AIR: 0.4992, SOFT_TISSUE: 0.5497, BONE: 0.5148}
+
+# Photons transported per batch and the default energy-table resolution (keV)
+DEFAULT_BATCH_SIZE = 200_000
+ENERGY_STEP = 0.5
+
+# Per-process state set up by _init_worker
+_worker = {}
+
+
+def klein_nishina_cross_section(energy):
+    """Total Klein-Nishina cross-section per electron (cm^2) at `energy` keV."""
+    k = np.asarray(energy, dtype=np.float64) / ELECTRON_ENERGY
+    log_term = np.log1p(2 * k)
+    return 2 * np.pi * ELECTRON_RADIUS ** 2 * (
+        (1 + k) / k ** 2 * (2 * (1 + k) / (1 + 2 * k) - log_term / k)
+        + log_term / (2 * k)
+        - (1 + 3 * k) / (1 + 2 * k) ** 2
+    )
+
+
+@dataclasses.dataclass
+class InteractionTables:
+    """
+    Per-label total and Compton attenuation (1/cm) on a regular energy grid,
+    plus the majorant used for Woodcock tracking. Everything else is treated
+    as absorption (photoelectric, with coherent scatter folded in).
+    """
+
+    energy_step: float
+    total: np.ndarray
+    compton: np.ndarray
+    majorant: np.ndarray
+
+    @classmethod
+    def build(cls, max_energy, materials=PHYSICAL_MATERIALS, electron_fractions=None,
+              energy_step=ENERGY_STEP):
+        electron_fractions = dict(ELECTRON_FRACTIONS, **(electron_fractions or {}))
+        energies = np.maximum(np.arange(0, max_energy + 2 * energy_step, energy_step), 1.0)
+        labels = range(max(materials.labels) + 1)
+
+        total = materials.attenuation_matrix(energies, labels, dtype=np.float64).T
+        compton = np.zeros_like(total)
+        sigma = klein_nishina_cross_section(energies)
+        for label, material in materials:
+            electrons = material.density * AVOGADRO * electron_fractions.get(label, 0.5)
+            compton[label] = np.minimum(electrons * sigma, total[label])
+        return cls(energy_step, total, compton, total.max(axis=0))
+
+    def energy_index(self, energy):
+        index = np.rint(energy / self.energy_step).astype(np.intp)
+        return np.clip(index, 0, self.total.shape[1] - 1)
+
+
+def sample_klein_nishina(rng, energy):
+    """
+    Sample Compton scattering with Kahn's rejection method, vectorized over
+    photons. Returns (cos_theta, scattered_energy).
+    """
+    alpha = energy / ELECTRON_ENERGY
+    beta = 1 + 2 * alpha
+    ratio = np.empty_like(alpha)
+    pending = np.arange(alpha.size)
+    while pending.size:
+        a, b = alpha[pending], beta[pending]
+        r1, r2, r3 = rng.random((3, pending.size))
+        left = r1 < b / (b + 8)
+        x = np.where(left, 1 + 2 * a * r2, b / (1 + 2 * a * r2))
+        mu = 1 + (1 - x) / a
+        accepted = np.where(left, r3 < 4 * (1 / x - 1 / x ** 2), r3 < 0.5 * (mu ** 2 + 1 / x))
+        ratio[pending[accepted]] = x[accepted]
+        pending = pending[~accepted]
+
+    cos_theta = np.clip(1 + (1 - ratio) / alpha, -1, 1)
+    return cos_theta, energy / ratio
+
+
+def rotate_directions(rng, directions, cos_theta):
+    """Turn unit vectors by polar angle acos(cos_theta) and a uniform azimuth."""
+    u, v, w = directions.T
+    phi = 2 * np.pi * rng.random(cos_theta.size)
+    sin_theta = np.sqrt(np.maximum(0, 1 - cos_theta ** 2))
+    cos_phi, sin_phi = np.cos(phi), np.sin(phi)
+
+    out = np.empty_like(directions)
+    near_pole = np.abs(w) > 0.99999
+    norm = np.sqrt(np.maximum(1e-300, 1 - w ** 2))
+    out[:, 0] = cos_theta * u + sin_theta * (u * w * cos_phi - v * sin_phi) / norm
+    out[:, 1] = cos_theta * v + sin_theta * (v * w * cos_phi + u * sin_phi) / norm
+    out[:, 2] = cos_theta * w - sin_theta * norm * cos_phi
+    if near_pole.any():
+        out[near_pole, 0] = sin_theta[near_pole] * cos_phi[near_pole]
+        out[near_pole, 1] = sin_theta[near_pole] * sin_phi[near_pole]
+        out[near_pole, 2] = np.sign(w[near_pole]) * cos_theta[near_pole]
+    return out / np.linalg.norm(out, axis=1, keepdims=True)
+
+
+class DetectorTally:
+    """
+    Running detector tally of transmitted photons, split into primary and
+    scattered signal, with the sums needed for a per-pixel noise estimate.
+    """
+
+    def __init__(self, shape):
+        self.shape = tuple(shape)
+        self.signal = np.zeros(self.shape)
+        self.squares = np.zeros(self.shape)
+        self.scatter = np.zeros(self.shape)
+        self.emitted = 0
+        self.emitted_weight = 0.0
+
+    def add(self, other):
+        self.signal += other.signal
+        self.squares += other.squares
+        self.scatter += other.scatter
+        self.emitted += other.emitted
+        self.emitted_weight += other.emitted_weight
+        return self
+
+    @property
+    def image(self):
+        """Detected signal relative to an unattenuated beam (1 = no attenuation)."""
+        if not self.emitted_weight:
+            return np.zeros(self.shape)
+        return self.signal / (self.emitted_weight / self.signal.size)
+
+    @property
+    def scatter_fraction(self):
+        total = self.signal.sum()
+        return self.scatter.sum() / total if total else 0.0
+
+    @property
+    def noise_level(self):
+        """Median relative standard error over the pixels that saw photons."""
+        hit = self.signal > 0
+        if not hit.any():
+            return np.inf
+        return float(np.median(np.sqrt(self.squares[hit]) / self.signal[hit]))
+
+
+@dataclasses.dataclass(frozen=True)
+class MonteCarloSettings:
+    """
+    Beam and detector settings shared by every batch. Either beam_energy
+    (monochromatic, keV) or kvp (polychromatic spectrum) must be set. The
+    parallel beam rotates about the leg axis like forward_project, and the
+    detector has one voxel-sized pixel per (z, detector) position.
+    """
+
+    angle: float = 0.0
+    beam_energy: float = None
+    kvp: float = None
+    n_bins: int = 50
+    voxel_size: float = DEFAULT_VOXEL_SIZE
+    energy_integrating: bool = True
+
+    def source_energies(self, rng, n_photons):
+        if self.kvp is not None:
+            energies, weights = kvp_spectrum(self.kvp, self.n_bins)
+            return rng.choice(energies, size=n_photons, p=weights)
+        if self.beam_energy is None:
+            raise ValueError("set either beam_energy or kvp")
+        return np.full(n_photons, float(self.beam_energy))
+
+    @property
+    def max_energy(self):
+        return float(self.kvp if self.kvp is not None else self.beam_energy)
+
+
+def transport_batch(labels, settings, tables, rng, n_photons):
+    """
+    Transport one batch of photons through a uint8 label volume with
+    Woodcock (delta) tracking and return its DetectorTally.
+    """
+    height, nx, ny = labels.shape
+    n_detectors = max(nx, ny)
+    center = np.array([(height - 1) / 2, (nx - 1) / 2, (ny - 1) / 2])
+    box_low, box_high = np.full(3, -0.5), np.asarray(labels.shape) - 0.5
+
+    theta = np.deg2rad(settings.angle)
+    beam = np.array([0.0, np.cos(theta), np.sin(theta)])
+    u_axis = np.array([0.0, -np.sin(theta), np.cos(theta)])
+    reach = np.hypot(nx, ny) / 2 + 1
+
+    tally = DetectorTally((height, n_detectors))
+    energy = settings.source_energies(rng, n_photons)
+    weight_of = (lambda e: e / settings.max_energy) if settings.energy_integrating else np.ones_like
+    tally.emitted = n_photons
+    tally.emitted_weight = float(weight_of(energy).sum())
+
+    # Photons start uniformly over the detector footprint, upstream of the volume
+    v = rng.uniform(-0.5, height - 0.5, n_photons) - center[0]
+    u = rng.uniform(-0.5, n_detectors - 0.5, n_photons) - (n_detectors - 1) / 2
+    position = center + v[:, None] * [1.0, 0, 0] + u[:, None] * u_axis - reach * beam
+    direction = np.tile(beam, (n_photons, 1))
+    scattered = np.zeros(n_photons, dtype=bool)
+
+    # Move every photon to its entry point on the volume's bounding box
+    with np.errstate(divide='ignore', invalid='ignore'):
+        low = (box_low - position) / direction
+        high = (box_high - position) / direction
+    enter = np.nanmax(np.where(np.isnan(low), -np.inf, np.minimum(low, high)), axis=1)
+    exit_ = np.nanmin(np.where(np.isnan(high), np.inf, np.maximum(low, high)), axis=1)
+    inside = exit_ > enter
+    position[inside] += (enter[inside] + 1e-9)[:, None] * direction[inside]
+
+    def detect(index):
+        # Photons leaving the volume towards the detector plane are tallied
+        d = direction[index]
+        towards = d @ beam > 1e-12
+        index, d = index[towards], d[towards]
+        p = position[index]
+        t = (reach - (p - center) @ beam) / (d @ beam)
+        hit = p + t[:, None] * d
+        row = np.rint(hit[:, 0]).astype(np.intp)
+        col = np.rint((hit - center) @ u_axis + (n_detectors - 1) / 2).astype(np.intp)
+        on_detector = (row >= 0) & (row < height) & (col >= 0) & (col < n_detectors)
+        index, row, col = index[on_detector], row[on_detector], col[on_detector]
+        weight = weight_of(energy[index])
+        np.add.at(tally.signal, (row, col), weight)
+        np.add.at(tally.squares, (row, col), weight ** 2)
+        np.add.at(tally.scatter, (row, col), np.where(scattered[index], weight, 0))
+
+    detect(np.flatnonzero(~inside))
+    alive = np.flatnonzero(inside)
+    flat_labels = labels.ravel()
+    strides = np.array([nx * ny, ny, 1])
+    while alive.size:
+        e_index = tables.energy_index(energy[alive])
+        majorant = tables.majorant[e_index]
+        step = -np.log(1 - rng.random(alive.size)) / majorant / settings.voxel_size
+        position[alive] += step[:, None] * direction[alive]
+
+        p = position[alive]
+        escaped = np.any((p < box_low) | (p > box_high), axis=1)
+        detect(alive[escaped])
+        alive, e_index, majorant = alive[~escaped], e_index[~escaped], majorant[~escaped]
+
+        # Real or virtual collision, decided by the local attenuation
+        voxel = np.clip(np.rint(position[alive]).astype(np.intp), 0, np.asarray(labels.shape) - 1)
+        label = flat_labels[voxel @ strides]
+        total = tables.total[label, e_index]
+        real = rng.random(alive.size) * majorant < total
+        compton = rng.random(alive.size) * total < tables.compton[label, e_index]
+
+        absorbed = real & ~compton
+        scatter = alive[real & compton]
+        if scatter.size:
+            cos_theta, energy[scatter] = sample_klein_nishina(rng, energy[scatter])
+            direction[scatter] = rotate_directions(rng, direction[scatter], cos_theta)
+            scattered[scatter] = True
+        alive = alive[~absorbed]
+    return tally
+
+
+def _init_worker(phantom_spec, settings, tables):
+    _worker['volume'] = SharedVolume.attach(*phantom_spec, readonly=True)
+    _worker['settings'] = settings
+    _worker['tables'] = tables
+
+
+def _run_batch(job):
+    seed, n_photons = job
+    rng = np.random.default_rng(seed)
+    return transport_batch(_worker['volume'].array, _worker['settings'], _worker['tables'],
+                           rng, n_photons)
+
+
+def iter_monte_carlo(phantom, settings, seed=0, batch_size=DEFAULT_BATCH_SIZE,
+                     max_batches=100, max_workers=None, materials=PHYSICAL_MATERIALS):
+    """
+    Run Monte Carlo batches and yield the accumulated DetectorTally after
+    each one, so accuracy improves progressively and the caller may stop at
+    any time.
+
+    Batch i always uses the i-th stream spawned from `seed`, and tallies are
+    accumulated in batch order, so results are reproducible regardless of
+    how many worker processes run them.
+    """
+    labels = label_indices(np.asarray(phantom))
+    tables = InteractionTables.build(settings.max_energy, materials)
+    seeds = np.random.SeedSequence(seed).spawn(max_batches)
+    jobs = ((child, batch_size) for child in seeds)
+    total = DetectorTally((labels.shape[0], max(labels.shape[1:])))
+
+    if not max_workers or max_workers == 1:
+        for child, n_photons in jobs:
+            rng = np.random.default_rng(child)
+            yield total.add(transport_batch(labels, settings, tables, rng, n_photons))
+        return
+
+    with SharedVolume.from_array(labels) as volume, \
+            ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                initargs=(volume.spec, settings, tables)) as executor:
+        # Ordered map; leaving the generator early cancels the remaining batches
+        results = executor.map(_run_batch, jobs)
+        try:
+            for batch in results:
+                yield total.add(batch)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def run_monte_carlo(phantom, settings, target_noise=0.02, seed=0, batch_size=DEFAULT_BATCH_SIZE,
+                    max_batches=100, max_workers=None, materials=PHYSICAL_MATERIALS):
+    """
+    Stream Monte Carlo batches until the tally's noise level reaches
+    `target_noise` (or `max_batches` batches have run) and return the tally.
+    """
+    tally = None
+    for tally in iter_monte_carlo(phantom, settings, seed, batch_size, max_batches,
+                                  max_workers, materials):
+        if tally.noise_level <= target_noise:
+            break
+    return tally
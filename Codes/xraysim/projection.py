@@ -0,0 +1,169 @@
+import numpy as np
+
+from .instrument import traced
+from .materials import AIR, BONE, DEFAULT_MATERIALS, SOFT_TISSUE
+from .volume import DEFAULT_Z_CHUNK, iter_z_chunks
+
+
+def attenuation_coefficients(beam_energy, materials=None):
+    """
+    Return the (tissue, bone) attenuation factors used by the simulator for a
+    given beam energy in keV.
+    """
+    lut = attenuation_lut(beam_energy, materials, dtype=np.float64)
+    return lut[SOFT_TISSUE], lut[BONE]
+
+
+def attenuation_lut(beam_energy, materials=None, dtype=np.float32):
+    """
+    Build the label -> attenuation lookup table (index 0 is air) from a
+    material table, by default the simulator's original linear model.
+    """
+    if materials is None:
+        materials = DEFAULT_MATERIALS
+    return materials.attenuation_lut(beam_energy, dtype)
+
+
+def label_indices(phantom):
+    """
+    Convert a phantom into LUT indices. Integer label volumes are used as-is;
+    any other value (e.g. interpolated voxels) is treated as air, matching the
+    original equality tests.
+    """
+    phantom = np.asarray(phantom)
+    if phantom.dtype == np.uint8:
+        return phantom
+
+    indices = np.zeros(phantom.shape, dtype=np.uint8)
+    indices[phantom == SOFT_TISSUE] = SOFT_TISSUE
+    indices[phantom == BONE] = BONE
+    return indices
+
+
+def line_integral(phantom, lut, chunk_size=DEFAULT_Z_CHUNK):
+    """
+    Sum the attenuation of every voxel along the z-axis (the beam direction).
+    The volume is read one z-chunk at a time, so memory-mapped phantoms never
+    have to fit in RAM.
+    """
+    # Pad the LUT so any uint8 value can be gathered; unknown labels are air
+    full_lut = np.zeros(256, dtype=lut.dtype)
+    full_lut[:lut.size] = lut
+
+    attenuation_sum = np.zeros(phantom.shape[1:], dtype=lut.dtype)
+    for z_start, z_end in iter_z_chunks(phantom.shape[0], chunk_size):
+        indices = label_indices(phantom[z_start:z_end])
+        attenuation_sum += np.take(full_lut, indices).sum(axis=0, dtype=lut.dtype)
+    return attenuation_sum
+
+
+@traced('simulate_xray_image')
+def simulate_xray_image(phantom, beam_energy, source_distance, chunk_size=DEFAULT_Z_CHUNK,
+                        materials=None):
+    """
+    Simulate the X-ray image of the phantom with the beam travelling along the
+    z-axis, using the Beer-Lambert law. Returns a float32 (width, depth) image.
+
+    A LabelPhantom brings its own material table; otherwise `materials`
+    (default: the original linear model) is used.
+    """
+    if materials is None:
+        materials = getattr(phantom, 'materials', None)
+    attenuation_sum = line_integral(phantom, attenuation_lut(beam_energy, materials), chunk_size)
+
+    # Calculate intensity based on attenuation and distance
+    return np.exp(-attenuation_sum / np.float32(source_distance))
+
+
+def material_labels(phantom):
+    """
+    Non-air labels of the phantom's material table; tissue and bone for
+    plain arrays.
+    """
+    materials = getattr(phantom, 'materials', None)
+    if materials is None:
+        return (SOFT_TISSUE, BONE)
+    return tuple(label for label in materials.labels if label != AIR)
+
+
+class PathLengthMap:
+    """
+    Per-ray voxel counts for each material label of a phantom.
+
+    The line integral is linear in the attenuation of each material, so once
+    the counts are known a new beam energy or source distance only costs a
+    weighted sum over the detector pixels instead of a pass over the volume.
+    """
+
+    def __init__(self, counts, labels=(SOFT_TISSUE, BONE), materials=None):
+        self.counts = np.asarray(counts, dtype=np.float32)
+        self.labels = tuple(labels)
+        self.materials = materials
+        if self.counts.shape[0] != len(self.labels):
+            raise ValueError("counts must have one map per label")
+
+    @classmethod
+    @traced('PathLengthMap.from_phantom')
+    def from_phantom(cls, phantom, angle=0.0, labels=None, chunk_size=DEFAULT_Z_CHUNK):
+        """
+        Count the voxels of each label along the z-axis. A non-zero angle
+        rotates the count maps in the detector plane, like
+        generate_angle_projection does for the summed volume.
+
+        By default every non-air label of the phantom's material table is
+        counted (tissue and bone for plain arrays).
+        """
+        materials = getattr(phantom, 'materials', None)
+        if labels is None:
+            labels = material_labels(phantom)
+        counts = np.zeros((len(labels),) + tuple(phantom.shape[1:]), dtype=np.float32)
+        for z_start, z_end in iter_z_chunks(phantom.shape[0], chunk_size):
+            chunk = np.asarray(phantom[z_start:z_end])
+            for counts_map, label in zip(counts, labels):
+                counts_map += np.count_nonzero(chunk == label, axis=0)
+
+        return cls(counts, labels, materials).rotated(angle)
+
+    def rotated(self, angle):
+        """
+        The count maps rotated by `angle` degrees in the detector plane, so
+        maps for many angles need the volume counted only once.
+        """
+        if not angle % 360:
+            return self
+        from scipy.ndimage import rotate
+
+        counts = rotate(self.counts, angle, axes=(1, 2), reshape=False, order=1,
+                        mode='constant', cval=0)
+        return PathLengthMap(counts, self.labels, self.materials)
+
+    @property
+    def shape(self):
+        """Shape of the detector image."""
+        return self.counts.shape[1:]
+
+    def downsample(self, factor):
+        """
+        Coarser map with the counts averaged over factor x factor pixel
+        blocks (edges that do not fill a block are dropped), for previews.
+        """
+        if factor <= 1:
+            return self
+        rows, cols = (size // factor * factor for size in self.shape)
+        blocks = self.counts[:, :rows, :cols].reshape(
+            len(self.labels), rows // factor, factor, cols // factor, factor)
+        return PathLengthMap(blocks.mean(axis=(2, 4)), self.labels, self.materials)
+
+    def line_integral(self, beam_energy):
+        """
+        Total attenuation along every ray for the given beam energy.
+        """
+        mu = attenuation_lut(beam_energy, self.materials)[list(self.labels)]
+        return np.tensordot(mu, self.counts, axes=1)
+
+    @traced('PathLengthMap.render')
+    def render(self, beam_energy, source_distance):
+        """
+        Same image as simulate_xray_image, computed from the cached counts.
+        """
+        return np.exp(-self.line_integral(beam_energy) / np.float32(source_distance))
@@ -0,0 +1,167 @@
+import itertools
+
+import numpy as np
+
+from .instrument import traced
+from .projection import PathLengthMap, material_labels
+from .volume import DEFAULT_Z_CHUNK, iter_z_chunks
+
+# Levels are added while the longest edge of the next one is at least this long
+DEFAULT_MIN_SIZE = 16
+
+# Extra levels below the display level used for drafts while a slider moves
+DRAFT_STEPS = 2
+
+
+def downsample_labels(labels, factor=2):
+    """
+    Shrink a label array of any dimension by `factor` along every axis,
+    keeping the most frequent label of each block; ties go to the higher
+    label, so thin bone survives next to tissue and air. Edges that do not
+    fill a block are padded with their last value.
+    """
+    labels = np.asarray(labels)
+    padding = [(0, -size % factor) for size in labels.shape]
+    if any(after for _, after in padding):
+        labels = np.pad(labels, padding, mode='edge')
+
+    # One strided view per position inside the block, counted label by label
+    views = [labels[tuple(slice(offset, None, factor) for offset in offsets)]
+             for offsets in itertools.product(range(factor), repeat=labels.ndim)]
+    values = np.unique(labels)[::-1]
+    counts = np.zeros((len(values),) + views[0].shape, dtype=np.min_scalar_type(len(views)))
+    for count, value in zip(counts, values):
+        for view in views:
+            count += view == value
+    return values[counts.argmax(axis=0)].astype(labels.dtype)
+
+
+def _level_for(shapes, size):
+    # Coarsest level whose longest edge still covers `size` display pixels
+    for level in range(len(shapes) - 1, -1, -1):
+        if max(shapes[level]) >= size:
+            return level
+    return 0
+
+
+def preview_levels(pyramid, size, draft_steps=DRAFT_STEPS):
+    """
+    (draft, final) pyramid levels for a preview `size` pixels across, as a
+    RenderScheduler levels tuple: the display level and one a few steps
+    coarser, or just the display level when nothing is coarser.
+    """
+    final = pyramid.level_for(size)
+    draft = min(final + draft_steps, len(pyramid) - 1)
+    return (draft, final) if draft != final else (final,)
+
+
+class LabelPyramid:
+    """
+    A label volume (or slice) plus copies downsampled by 2, 4, 8, ... along
+    every axis, for level-of-detail viewing.
+
+    Level 0 is the volume itself, so it may be an EditedPhantom, a memmap
+    or a ChunkedDataset; coarser levels are built once, each from the one
+    above, one z-chunk at a time. After an edit only the slices it touches
+    are recomputed (update or apply_edit), at every level.
+    """
+
+    def __init__(self, volume, min_size=DEFAULT_MIN_SIZE, chunk_size=DEFAULT_Z_CHUNK):
+        self.levels = [volume]
+        self.chunk_size = max(2, chunk_size)
+        shape = tuple(volume.shape)
+        while max(shape) // 2 >= min_size:
+            shape = tuple(-(-size // 2) for size in shape)
+            self.levels.append(np.empty(shape, dtype=volume.dtype))
+        self.update(0, volume.shape[0])
+
+    def __len__(self):
+        return len(self.levels)
+
+    def __getitem__(self, level):
+        return self.levels[level]
+
+    @property
+    def shapes(self):
+        return [tuple(level.shape) for level in self.levels]
+
+    def factor(self, level):
+        """Downsampling factor of a level relative to level 0."""
+        return 2 ** level
+
+    def level_for(self, size):
+        """Coarsest level that still has `size` voxels along its longest edge."""
+        return _level_for(self.shapes, size)
+
+    @traced('LabelPyramid.update')
+    def update(self, z_start, z_end):
+        """Recompute the coarse levels over level-0 slices [z_start, z_end)."""
+        for source, target in zip(self.levels, self.levels[1:]):
+            z_start, z_end = z_start // 2, min(-(-z_end // 2), target.shape[0])
+            for start, end in iter_z_chunks(z_end - z_start, self.chunk_size // 2):
+                start, end = z_start + start, z_start + end
+                target[start:end] = downsample_labels(
+                    np.asarray(source[2 * start:min(2 * end, source.shape[0])]))
+
+    def apply_edit(self, edit):
+        """Refresh the levels after `edit` was pushed to (or undone from) level 0."""
+        self.update(*edit.z_range(self.levels[0].shape))
+
+
+class PathLengthPyramid:
+    """
+    Axial PathLengthMaps of a phantom at full resolution and downsampled by
+    2, 4, 8, ...
+
+    The label counts are kept per z-chunk, so after an edit only the chunks
+    it touches are recounted; the full map is their sum and every coarser
+    level is a block average of it.
+    """
+
+    def __init__(self, phantom, labels=None, min_size=DEFAULT_MIN_SIZE, chunk_size=DEFAULT_Z_CHUNK):
+        self.phantom = phantom
+        self.labels = material_labels(phantom) if labels is None else tuple(labels)
+        self.materials = getattr(phantom, 'materials', None)
+        self.chunk_size = chunk_size
+        self.min_size = min_size
+        n_chunks = -(-phantom.shape[0] // chunk_size)
+        # Chunk counts never exceed chunk_size, so 16 bits are enough
+        dtype = np.uint16 if chunk_size < 2 ** 16 else np.uint32
+        self._partials = np.zeros((n_chunks, len(self.labels)) + tuple(phantom.shape[1:]), dtype=dtype)
+        self.levels = []
+        self.update(0, phantom.shape[0])
+
+    def __len__(self):
+        return len(self.levels)
+
+    def __getitem__(self, level):
+        return self.levels[level]
+
+    @property
+    def shapes(self):
+        return [level.shape for level in self.levels]
+
+    def factor(self, level):
+        return 2 ** level
+
+    def level_for(self, size):
+        """Coarsest level that still has `size` pixels along its longest edge."""
+        return _level_for(self.shapes, size)
+
+    @traced('PathLengthPyramid.update')
+    def update(self, z_start, z_end):
+        """Recount the z-chunks overlapping [z_start, z_end) and rebuild every level."""
+        first, last = z_start // self.chunk_size, -(-z_end // self.chunk_size)
+        for index in range(first, min(last, len(self._partials))):
+            chunk = np.asarray(self.phantom[index * self.chunk_size:(index + 1) * self.chunk_size])
+            for counts, label in zip(self._partials[index], self.labels):
+                counts[...] = np.count_nonzero(chunk == label, axis=0)
+
+        full = PathLengthMap(self._partials.sum(axis=0, dtype=np.float32), self.labels, self.materials)
+        self.levels = [full]
+        while max(self.levels[-1].shape) // 2 >= self.min_size:
+            self.levels.append(full.downsample(self.factor(len(self.levels))))
+
+    def apply_edit(self, edit):
+        """Refresh the levels after `edit` was pushed to (or undone from) the phantom."""
+        self.update(*edit.z_range(self.phantom.shape))
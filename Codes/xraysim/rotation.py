@@ -0,0 +1,116 @@
+import functools
+
+import numpy as np
+from scipy.ndimage import map_coordinates, spline_filter
+
+from .instrument import span, traced
+
+# Rotation angles are rounded to this many degrees so coordinate maps are reused
+ANGLE_STEP = 0.1
+
+# Number of (shape, angle) coordinate maps kept alive by the cache
+ROTATION_CACHE_SIZE = 256
+
+# Zero border added before spline prefiltering, as scipy.ndimage does for 'grid-constant'
+SPLINE_PAD = 12
+
+
+def quantize_angle(angle, step=ANGLE_STEP):
+    """Round an angle in degrees to the coordinate-map grid, within [0, 360)."""
+    if not step:
+        return float(angle) % 360
+    return round(round(angle / step) * step % 360, 10)
+
+
+@functools.lru_cache(maxsize=ROTATION_CACHE_SIZE)
+def rotation_coordinates(shape, angle, offset=0):
+    """
+    (2, rows, cols) input coordinates sampled by every output pixel when a
+    slice of `shape` is rotated by `angle` degrees about its centre, with the
+    same orientation as scipy.ndimage.rotate. `offset` shifts them into a
+    padded copy of the slice. Cached and read-only.
+    """
+    theta = np.deg2rad(angle)
+    cos_t, sin_t = np.cos(theta), np.sin(theta)
+    rows, cols = shape
+    center_row, center_col = (rows - 1) / 2 + offset, (cols - 1) / 2 + offset
+    row = (np.arange(rows) - (rows - 1) / 2)[:, np.newaxis]
+    col = (np.arange(cols) - (cols - 1) / 2)[np.newaxis, :]
+
+    coordinates = np.empty((2, rows, cols), dtype=np.float32)
+    coordinates[0] = cos_t * row + sin_t * col + center_row
+    coordinates[1] = -sin_t * row + cos_t * col + center_col
+    coordinates.setflags(write=False)
+    return coordinates
+
+
+def _prefiltered(slice_image, order):
+    # Spline coefficients are computed once per slice and shared by every angle
+    slice_image = np.asarray(slice_image, dtype=np.float64)
+    if order <= 1:
+        return slice_image, 0
+    padded = np.pad(slice_image, SPLINE_PAD)
+    return spline_filter(padded, order, mode='grid-constant'), SPLINE_PAD
+
+
+def rotate_slices(slice_image, angles, order=3, step=ANGLE_STEP, out=None):
+    """
+    Rotate one 2D slice by each of `angles` (degrees) into an
+    (n_angles, rows, cols) stack.
+
+    Only the output pixels are sampled, from cached coordinate maps, so the
+    cost is proportional to the output size. Everything outside the slice is
+    zero ('grid-constant'), which is what zero-padding before
+    scipy.ndimage.rotate gave.
+    """
+    shape = np.shape(slice_image)
+    coefficients, offset = _prefiltered(slice_image, order)
+    if out is None:
+        out = np.empty((len(angles),) + shape, dtype=np.float64)
+    for index, angle in enumerate(angles):
+        coordinates = rotation_coordinates(shape, quantize_angle(angle, step), offset)
+        map_coordinates(coefficients, coordinates, output=out[index], order=order,
+                        mode='grid-constant', cval=0.0, prefilter=False)
+    return out
+
+
+def rotate_slice(slice_image, angle, order=3, step=ANGLE_STEP):
+    """rotate_slices for a single angle."""
+    return rotate_slices(slice_image, [angle], order, step)[0]
+
+
+def _normalize(images):
+    # Scale every image to a peak of one; all-zero images stay zero instead of NaN
+    peak = images.max(axis=(-2, -1), keepdims=True)
+    np.divide(images, peak, out=images, where=peak > 0)
+    images[np.broadcast_to(peak <= 0, images.shape)] = 0
+    return np.clip(images, 0, 1, out=images)
+
+
+@traced('adjust_phantom_slices')
+def adjust_phantom_slices(slice_image, angles, beam_energy, source_distance, order=3):
+    """
+    adjust_phantom_slice for a batch of angles, shape (n_angles, rows, cols).
+    The spline prefilter runs once for the whole batch.
+    """
+    with span('adjust_phantom_slice.rotate'):
+        rotated = rotate_slices(slice_image, angles, order)
+
+    # Adjust intensity based on beam energy and source distance
+    attenuation_factor = (beam_energy / 100) * (200 / source_distance)
+    rotated *= attenuation_factor
+
+    # Normalize the values for display (to avoid clipping or too dark visuals)
+    with span('adjust_phantom_slice.normalize'):
+        return _normalize(rotated)
+
+
+@traced('adjust_phantom_slice')
+def adjust_phantom_slice(slice_image, angle, beam_energy, source_distance, order=3):
+    """
+    Rotate a phantom slice by `angle` degrees and scale it for the beam
+    energy and source distance, normalised to [0, 1] for display. An empty
+    slice gives an all-zero image. `order` is the spline interpolation order
+    (3 as before; 1 or 0 are cheaper for previews).
+    """
+    return adjust_phantom_slices(slice_image, [angle], beam_energy, source_distance, order)[0]
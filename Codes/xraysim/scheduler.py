@@ -0,0 +1,105 @@
+import queue
+import threading
+
+# Levels rendered for every request, coarsest first. They are opaque keys
+# handed to the render callback; the GUIs pass pyramid level indices from
+# preview_levels, and this default is two pyramid levels down, then full size
+DEFAULT_LEVELS = (2, 0)
+
+
+class RenderScheduler:
+    """
+    Runs renders on a worker thread so slider callbacks return immediately.
+
+    Requests are coalesced: the worker only ever picks up the latest one, and
+    a request that has been superseded is abandoned between levels. Its
+    coarse image is still shown if nothing newer has finished, so a drag
+    keeps updating.
+
+    Each request is rendered coarse first; the refinement to the later levels
+    waits until the parameters have been still for `settle_ms`, so a drag
+    shows cheap previews and only the final position pays for the full
+    render.
+
+    `levels` are whatever keys `render` understands, coarsest first.
+    `render(params, level)` runs on the worker thread and must not touch Tk.
+    `show(params, level, image)` runs on the Tk thread: finished images are
+    handed over through a queue polled with `widget.after`, since Tk itself
+    is not thread-safe.
+    """
+
+    def __init__(self, widget, render, show, levels=DEFAULT_LEVELS, settle_ms=120, poll_ms=15):
+        self.widget = widget
+        self.render = render
+        self.show = show
+        self.levels = tuple(levels)
+        self.settle = settle_ms / 1000
+        self.poll_ms = poll_ms
+
+        self._condition = threading.Condition()
+        self._pending = None
+        self._generation = 0
+        self._shown = 0
+        self._closed = False
+        self._results = queue.Queue()
+
+        self._thread = threading.Thread(target=self._work, name="render-scheduler", daemon=True)
+        self._thread.start()
+        self._poll_id = self.widget.after(self.poll_ms, self._poll)
+
+    def request(self, params):
+        """Schedule a render of `params`, replacing any request not yet started."""
+        with self._condition:
+            self._generation += 1
+            self._pending = (self._generation, params)
+            self._condition.notify()
+
+    def _is_stale(self, generation):
+        return generation != self._generation
+
+    def _next_request(self):
+        with self._condition:
+            while self._pending is None and not self._closed:
+                self._condition.wait()
+            request, self._pending = self._pending, None
+            return request
+
+    def _work(self):
+        request = self._next_request()
+        while request is not None:
+            generation, params = request
+            for i, level in enumerate(self.levels):
+                if i:
+                    # Hold back the refinement while newer requests keep arriving
+                    with self._condition:
+                        self._condition.wait_for(
+                            lambda: self._closed or self._is_stale(generation), self.settle)
+                if self._closed or self._is_stale(generation):
+                    break
+                image = self.render(params, level)
+                self._results.put((generation, params, level, image))
+            request = self._next_request()
+
+    def _poll(self):
+        # Show only the newest finished image; older ones are dropped unseen
+        latest = None
+        while True:
+            try:
+                result = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if result[0] >= self._shown:
+                latest = result
+        if latest is not None:
+            self._shown, params, level, image = latest
+            self.show(params, level, image)
+        if not self._closed:
+            self._poll_id = self.widget.after(self.poll_ms, self._poll)
+
+    def close(self):
+        """Stop the worker thread and the polling loop."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self.widget.after_cancel(self._poll_id)
+        self._thread.join(timeout=1.0)
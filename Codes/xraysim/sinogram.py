@@ -0,0 +1,172 @@
+import dataclasses
+import functools
+
+import numpy as np
+from scipy import sparse
+from scipy.ndimage import rotate
+
+from .instrument import traced
+from .volume import iter_z_chunks
+
+# Number of system matrices kept alive by the cache
+SYSTEM_MATRIX_CACHE_SIZE = 4
+
+# Default number of z-slices projected per sparse product
+DEFAULT_CHUNK_SIZE = 64
+
+
+@dataclasses.dataclass(frozen=True)
+class ParallelBeamGeometry:
+    """
+    Parallel-beam CT geometry rotating about the z (leg) axis.
+
+    Rays lie in the x-y plane of each slice; at angle 0 they travel along x,
+    so the projection of a slice is its sum over the x-axis. Angles are in
+    degrees and detector bins are one voxel wide, centred on the slice.
+    """
+
+    shape: tuple
+    angles: tuple
+    n_detectors: int
+
+    @classmethod
+    def for_phantom(cls, phantom, angles, n_detectors=None):
+        """Geometry matching the x-y extent of a (height, X, Y) phantom."""
+        shape = tuple(int(n) for n in np.shape(phantom)[1:])
+        angles = tuple(float(angle) for angle in np.atleast_1d(angles))
+        if n_detectors is None:
+            n_detectors = max(shape)
+        return cls(shape, angles, int(n_detectors))
+
+    @property
+    def n_angles(self):
+        return len(self.angles)
+
+    @property
+    def detector_positions(self):
+        """Signed distance of each detector bin from the rotation axis."""
+        return np.arange(self.n_detectors) - (self.n_detectors - 1) / 2
+
+
+def _joseph_weights(geometry, angle):
+    """
+    Ray-driven (Joseph) interpolation weights for one angle: every ray is
+    stepped one voxel at a time along the axis it is most aligned with and
+    linearly interpolated along the other one.
+    """
+    nx, ny = geometry.shape
+    cx, cy = (nx - 1) / 2, (ny - 1) / 2
+    theta = np.deg2rad(angle)
+    cos_t, sin_t = np.cos(theta), np.sin(theta)
+    s = geometry.detector_positions[:, np.newaxis]
+
+    x_major = abs(cos_t) >= abs(sin_t)
+    if x_major:
+        # Step along x, interpolate along y
+        i = np.arange(nx)[np.newaxis, :]
+        t = (i - cx + s * sin_t) / cos_t
+        j = cy + s * cos_t + t * sin_t
+        major, minor, n_minor, step = i, j, ny, 1 / abs(cos_t)
+    else:
+        # Step along y, interpolate along x
+        j = np.arange(ny)[np.newaxis, :]
+        t = (j - cy - s * cos_t) / sin_t
+        i = cx - s * sin_t + t * cos_t
+        major, minor, n_minor, step = j, i, nx, 1 / abs(sin_t)
+
+    lower = np.floor(minor)
+    frac = minor - lower
+    lower = lower.astype(np.int64)
+    major = np.broadcast_to(major, minor.shape)
+    rays = np.broadcast_to(np.arange(geometry.n_detectors)[:, np.newaxis], minor.shape)
+
+    rows, cols, vals = [], [], []
+    for offset, weight in ((0, 1 - frac), (1, frac)):
+        neighbour = lower + offset
+        valid = (neighbour >= 0) & (neighbour < n_minor) & (weight > 0)
+        if x_major:
+            flat = major[valid] * ny + neighbour[valid]
+        else:
+            flat = neighbour[valid] * ny + major[valid]
+        rows.append(rays[valid])
+        cols.append(flat)
+        vals.append(weight[valid] * step)
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(vals)
+
+
+@functools.lru_cache(maxsize=SYSTEM_MATRIX_CACHE_SIZE)
+def system_matrix(geometry):
+    """
+    Sparse (n_angles * n_detectors, X * Y) projection matrix for one slice.
+    Row a * n_detectors + d holds the weights of detector d at angle a.
+    """
+    rows, cols, vals = [], [], []
+    for index, angle in enumerate(geometry.angles):
+        angle_rows, angle_cols, angle_vals = _joseph_weights(geometry, angle)
+        rows.append(angle_rows + index * geometry.n_detectors)
+        cols.append(angle_cols)
+        vals.append(angle_vals)
+
+    shape = (geometry.n_angles * geometry.n_detectors, geometry.shape[0] * geometry.shape[1])
+    matrix = sparse.csr_matrix(
+        (np.concatenate(vals).astype(np.float32),
+         (np.concatenate(rows), np.concatenate(cols))),
+        shape=shape,
+    )
+    matrix.sum_duplicates()
+    return matrix
+
+
+@traced('forward_project')
+def forward_project(phantom, angles, n_detectors=None, chunk_size=DEFAULT_CHUNK_SIZE, out=None):
+    """
+    Project the phantom at every angle in one pass.
+
+    Returns a float32 (n_angles, height, n_detectors) stack. The volume is
+    processed in z-chunks, each projected for all angles with a single sparse
+    product, and written into `out` when a preallocated buffer is supplied.
+    """
+    geometry = ParallelBeamGeometry.for_phantom(phantom, angles, n_detectors)
+    matrix = system_matrix(geometry)
+
+    height = phantom.shape[0]
+    if out is None:
+        out = np.empty((geometry.n_angles, height, geometry.n_detectors), dtype=np.float32)
+
+    # One (X * Y, chunk) buffer is reused for every chunk of slices
+    buffer = np.empty((matrix.shape[1], min(chunk_size, height)), dtype=np.float32)
+    for z_start in range(0, height, chunk_size):
+        z_end = min(z_start + chunk_size, height)
+        columns = buffer[:, :z_end - z_start]
+        columns[...] = np.asarray(phantom[z_start:z_end]).reshape(z_end - z_start, -1).T
+
+        projected = matrix @ columns
+        out[:, z_start:z_end, :] = projected.reshape(
+            geometry.n_angles, geometry.n_detectors, z_end - z_start).transpose(0, 2, 1)
+    return out
+
+
+def generate_angle_projection(phantom, angle):
+    """
+    Project the phantom along z after rotating it in the x-y plane.
+
+    Rotation and summation are both linear, so the summed image is rotated
+    instead of the whole volume; the result equals rotating the volume first.
+    """
+    return generate_angle_projections(phantom, [angle])[0]
+
+
+@traced('generate_angle_projections')
+def generate_angle_projections(phantom, angles):
+    """
+    Stack of generate_angle_projection results, shape (n_angles, X, Y). The
+    volume is summed once and every angle rotates into a shared output buffer.
+    """
+    # Sum chunk by chunk so memory-mapped and lazily edited volumes work too
+    projection = np.zeros(phantom.shape[1:], dtype=np.result_type(phantom.dtype, np.float32))
+    for z_start, z_end in iter_z_chunks(phantom.shape[0], DEFAULT_CHUNK_SIZE):
+        projection += np.sum(phantom[z_start:z_end], axis=0)
+    out = np.empty((len(angles),) + projection.shape, dtype=projection.dtype)
+    for index, angle in enumerate(angles):
+        rotate(projection, angle, reshape=False, mode='constant', cval=0, output=out[index])
+    return out
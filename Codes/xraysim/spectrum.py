@@ -0,0 +1,58 @@
+import numpy as np
+
+from .conebeam import DEFAULT_VOXEL_SIZE
+from .materials import PHYSICAL_MATERIALS
+
+# Lowest photon energy (keV) kept in a spectrum; softer photons never reach the detector
+MIN_ENERGY = 10.0
+
+# Aluminium mass attenuation (cm^2/g) for the tube filtration, NIST, at the energies below
+_ALUMINIUM_ENERGIES = (10.0, 15.0, 20.0, 30.0, 40.0, 50.0, 60.0, 80.0, 100.0, 150.0)
+_ALUMINIUM_MU = (26.2, 7.96, 3.44, 1.13, 0.568, 0.368, 0.278, 0.202, 0.170, 0.138)
+_ALUMINIUM_DENSITY = 2.699
+
+
+def kvp_spectrum(kvp, n_bins=50, filtration_mm_al=2.5):
+    """
+    Discretized bremsstrahlung spectrum of a tube run at `kvp`.
+
+    Uses Kramers' law (photon count proportional to (kVp - E) / E) hardened
+    by `filtration_mm_al` mm of aluminium. Returns (energies, weights): the
+    bin-centre energies in keV and photon fractions that sum to one.
+    """
+    if kvp <= MIN_ENERGY:
+        raise ValueError(f"kvp must be above {MIN_ENERGY} keV")
+
+    edges = np.linspace(MIN_ENERGY, kvp, n_bins + 1)
+    energies = (edges[:-1] + edges[1:]) / 2
+    weights = (kvp - energies) / energies
+
+    mu_al = np.exp(np.interp(np.log(energies), np.log(_ALUMINIUM_ENERGIES), np.log(_ALUMINIUM_MU)))
+    weights *= np.exp(-mu_al * _ALUMINIUM_DENSITY * filtration_mm_al / 10)
+    return energies, weights / weights.sum()
+
+
+def simulate_polychromatic_image(path_lengths, kvp, n_bins=50, materials=PHYSICAL_MATERIALS,
+                                 length_scale=DEFAULT_VOXEL_SIZE, filtration_mm_al=2.5,
+                                 energy_integrating=True):
+    """
+    Detector image for a polychromatic beam, normalised so that an
+    unattenuated ray reads 1.
+
+    The per-material path lengths of a PathLengthMap are reused for every
+    energy bin: the (bins x materials) attenuation matrix times the
+    (materials x pixels) path lengths gives all line integrals in one
+    product. `length_scale` converts path-length units to cm (voxel size for
+    voxel counts, 1.0 for cone_beam_path_lengths). An energy-integrating
+    detector weighs each photon by its energy; otherwise photons are counted.
+    """
+    energies, weights = kvp_spectrum(kvp, n_bins, filtration_mm_al)
+    if energy_integrating:
+        weights = weights * energies
+        weights /= weights.sum()
+
+    mu = materials.attenuation_matrix(energies, path_lengths.labels)
+    lengths = path_lengths.counts.reshape(len(path_lengths.labels), -1) * np.float32(length_scale)
+    transmitted = np.exp(-(mu @ lengths))
+    image = weights.astype(np.float32) @ transmitted
+    return image.reshape(path_lengths.shape)
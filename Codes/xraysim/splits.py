@@ -0,0 +1,43 @@
+import numpy as np
+
+from .volume import DEFAULT_Z_CHUNK, iter_z_chunks
+
+
+def add_orthogonal_split(phantom, split_z_start, split_z_end, chunk_size=DEFAULT_Z_CHUNK):
+    """
+    Simulate an orthogonal split in the phantom by setting attenuation values to zero
+    in the specified z-range.
+    """
+    split_z_start, split_z_end, _ = slice(split_z_start, split_z_end).indices(phantom.shape[0])
+    for z_start, z_end in iter_z_chunks(max(0, split_z_end - split_z_start), chunk_size):
+        phantom[split_z_start + z_start:split_z_start + z_end, :, :] = 0
+
+
+def angled_split_mask(shape, m, n, x0, y0, z0, z_start=0):
+    """
+    Boolean mask of the voxels removed by an angled split, for the z-chunk of
+    the given shape starting at slice z_start.
+    """
+    height, width_x, width_y = shape
+
+    # Generate coordinate grids
+    z_indices = np.arange(z_start, z_start + height)[:, np.newaxis, np.newaxis]
+    x_indices = np.arange(width_x)[np.newaxis, :, np.newaxis]
+    y_indices = np.arange(width_y)[np.newaxis, np.newaxis, :]
+
+    # Calculate the plane equation
+    plane = m * (x_indices - x0) + n * (y_indices - y0) + z0
+    return z_indices >= plane
+
+
+def add_angled_split(phantom, m, n, x0, y0, z0, chunk_size=DEFAULT_Z_CHUNK):
+    """
+    Simulate an angled split in the phantom by setting attenuation values to zero
+    where z >= m*(x - x0) + n*(y - y0) + z0
+
+    The mask is built one z-chunk at a time, so memory-mapped volumes larger
+    than RAM can be split in place.
+    """
+    for z_start, z_end in iter_z_chunks(phantom.shape[0], chunk_size):
+        chunk = phantom[z_start:z_end]
+        chunk[angled_split_mask(chunk.shape, m, n, x0, y0, z0, z_start)] = 0
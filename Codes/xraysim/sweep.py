@@ -0,0 +1,198 @@
+import csv
+import itertools
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .cache import DEFAULT_CACHE_DIR, ImageCache, phantom_fingerprint
+from .conebeam import (DEFAULT_DETECTOR_DISTANCE, ConeBeamGeometry, cone_beam_path_lengths,
+                       render_cone_beam)
+from .dataset import DatasetWriter, is_dataset
+from .metrics import QualityMasks
+from .phantom import generate_label_phantom
+from .projection import PathLengthMap
+from .volume import SharedVolume
+
+# Columns written to results.csv, in order
+RESULT_FIELDS = ('case', 'beam_energy', 'angle', 'source_distance', 'image',
+                 'mean_intensity', 'min_intensity', 'max_intensity', 'contrast', 'cnr', 'snr',
+                 'mtf50', 'edge_width')
+
+# Per-process state set up by _init_worker
+_worker = {}
+
+
+def parameter_grid(energy_levels, angles, distances):
+    """
+    Every (beam_energy, angle, source_distance) combination as a list of
+    dicts, ordered so that cases sharing an angle are adjacent.
+    """
+    return [
+        {'beam_energy': float(energy), 'angle': float(angle), 'source_distance': float(distance)}
+        for angle, energy, distance in itertools.product(angles, energy_levels, distances)
+    ]
+
+
+def case_metrics(image, masks):
+    """
+    Scalar quality metrics of a simulated image, with regions from the
+    QualityMasks of its angle. Contrast compares the mean intensity behind
+    bone with the mean intensity behind soft tissue only.
+    """
+    quality = masks.measure(image)
+    return {
+        'mean_intensity': float(image.mean()),
+        'min_intensity': float(image.min()),
+        'max_intensity': float(image.max()),
+        **{name: float(quality[name][0]) for name in ('contrast', 'cnr', 'snr', 'mtf50', 'edge_width')},
+    }
+
+
+def cone_beam_detector(phantom, distances, detector_distance=DEFAULT_DETECTOR_DISTANCE):
+    """
+    Detector (distance, shape, pixel size) shared by every case of a
+    cone-beam sweep: large enough for the closest source, so images at all
+    source distances have the same shape and the magnification shows.
+    """
+    geometry = ConeBeamGeometry.for_phantom(phantom, min(distances), detector_distance)
+    return {'distance': geometry.detector_distance, 'shape': geometry.detector_shape,
+            'pixel_size': geometry.pixel_size}
+
+
+def _init_worker(phantom_spec, output_dir, fingerprint, cache_dir, chunked, detector):
+    # Every worker maps the same read-only shared phantom instead of a copy
+    _worker['volume'] = SharedVolume.attach(*phantom_spec, readonly=True)
+    _worker['phantom'] = _worker['volume'].array
+    _worker['detector'] = detector
+    _worker['path_lengths'] = {}
+    _worker['masks'] = {}
+    _worker['output_dir'] = output_dir
+    _worker['fingerprint'] = fingerprint
+    # Sweeps render the exact parameters they record, unlike the GUI sliders
+    _worker['cache'] = ImageCache(quantization={}, cache_dir=cache_dir)
+    _worker['chunked'] = chunked
+
+
+def _geometry(angle, source_distance):
+    detector = _worker['detector']
+    return ConeBeamGeometry(source_distance, detector['distance'], tuple(detector['shape']),
+                            detector['pixel_size'], angle)
+
+
+def _key(angle, source_distance):
+    # Parallel-beam rays do not depend on the source distance; cone-beam rays do
+    return angle if _worker['detector'] is None else (angle, source_distance)
+
+
+def _path_lengths(angle, source_distance):
+    maps = _worker['path_lengths']
+    key = _key(angle, source_distance)
+    if key not in maps:
+        if _worker['detector'] is None:
+            maps[key] = PathLengthMap.from_phantom(_worker['phantom'], angle=angle)
+        else:
+            maps[key] = cone_beam_path_lengths(_worker['phantom'], _geometry(angle, source_distance))
+    return maps[key]
+
+
+def _masks(angle, source_distance):
+    # Region keys are built once per ray geometry and shared by its energy cases
+    masks = _worker['masks']
+    key = _key(angle, source_distance)
+    if key not in masks:
+        masks[key] = QualityMasks.from_path_lengths([_path_lengths(angle, source_distance)])
+    return masks[key]
+
+
+def _render(beam_energy, angle, source_distance):
+    path_lengths = _path_lengths(angle, source_distance)
+    if _worker['detector'] is None:
+        return path_lengths.render(beam_energy, source_distance)
+    return render_cone_beam(path_lengths, beam_energy, _geometry(angle, source_distance),
+                            _worker['phantom'].shape)
+
+
+def _run_case(indexed_case):
+    index, case = indexed_case
+    image = _worker['cache'].get_or_compute(_worker['fingerprint'], case, _render)
+    metrics = case_metrics(image, _masks(case['angle'], case['source_distance']))
+    if _worker['chunked']:
+        # The parent appends the image to the shared dataset in grid order
+        return dict(case, case=index, image='images', **metrics), image
+
+    # Images are written by the worker so only the metrics travel back
+    name = os.path.join('images', f"case_{index:05d}.npy")
+    np.save(os.path.join(_worker['output_dir'], name), image)
+    return dict(case, case=index, image=name, **metrics), None
+
+
+def run_sweep(grid, output_dir, phantom_params=None, max_workers=None, cache_dir=DEFAULT_CACHE_DIR,
+              chunked=False, geometry='parallel', detector_distance=DEFAULT_DETECTOR_DISTANCE):
+    """
+    Simulate every case of a parameter grid across a process pool, without a
+    display. The phantom is placed in shared memory once and mapped
+    read-only by every worker.
+
+    Images go to output_dir/images/case_NNNNN.npy, one row of scalar metrics
+    per case to output_dir/results.csv, and the sweep settings to
+    output_dir/sweep.json. Returns the result rows in grid order.
+
+    With `cache_dir` set, images are looked up in (and added to) that
+    on-disk ImageCache, so repeated cases across sweeps are not recomputed.
+
+    With chunked=True, images are instead appended as they complete to a
+    compressed chunked dataset in output_dir/images (row = case index), so
+    a sweep of many cases leaves a few chunk files that stay readable while
+    it runs.
+
+    With geometry='cone', images are traced from a point source
+    `source_distance` cm from the leg axis onto a flat detector
+    `detector_distance` cm behind it (see cone_beam_detector), so the source
+    distance sets magnification and inverse-square falloff. The default
+    parallel geometry keeps the original exp(-sum / source_distance) model.
+    """
+    if geometry not in ('parallel', 'cone'):
+        raise ValueError(f"unknown geometry {geometry!r}")
+    phantom_params = dict(phantom_params or {})
+    if chunked and is_dataset(os.path.join(output_dir, 'images')):
+        # A rerun replaces the images of the previous one, as it does for .npy files
+        shutil.rmtree(os.path.join(output_dir, 'images'))
+    os.makedirs(os.path.join(output_dir, 'images'), exist_ok=True)
+    phantom = generate_label_phantom(**phantom_params)
+    fingerprint = phantom_fingerprint(phantom) + "/axial"
+    detector = None
+    if geometry == 'cone':
+        detector = cone_beam_detector(phantom, [case['source_distance'] for case in grid],
+                                      detector_distance)
+        fingerprint += "/cone/{distance:g}/{shape[0]}x{shape[1]}/{pixel_size:g}".format(**detector)
+    with open(os.path.join(output_dir, 'sweep.json'), 'w') as manifest:
+        json.dump({'phantom': phantom_params, 'geometry': geometry, 'detector': detector,
+                   'grid': list(grid)}, manifest, indent=2)
+
+    max_workers = max_workers or os.cpu_count() or 1
+    # Contiguous chunks keep cases that share an angle on the same worker
+    chunksize = max(1, len(grid) // (4 * max_workers))
+
+    results = []
+    images = None
+    with SharedVolume.from_array(phantom.labels) as volume, \
+            open(os.path.join(output_dir, 'results.csv'), 'w', newline='') as handle:
+        writer = csv.DictWriter(handle, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(volume.spec, output_dir, fingerprint, cache_dir,
+                                           chunked, detector)) as executor:
+            for row, image in executor.map(_run_case, enumerate(grid), chunksize=chunksize):
+                if image is not None:
+                    if images is None:
+                        images = DatasetWriter(os.path.join(output_dir, 'images'), image.shape,
+                                               image.dtype, axis='case')
+                    images.append(image)
+                writer.writerow(row)
+                results.append(row)
+    if images is not None:
+        images.close()
+    return results
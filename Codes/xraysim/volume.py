@@ -0,0 +1,90 @@
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Default number of z-slices processed at a time by chunked operations
+DEFAULT_Z_CHUNK = 32
+
+
+def iter_z_chunks(height, chunk_size=DEFAULT_Z_CHUNK):
+    """Yield (z_start, z_end) ranges covering a volume of the given height."""
+    for z_start in range(0, height, chunk_size):
+        yield z_start, min(z_start + chunk_size, height)
+
+
+def create_memmap_volume(path, shape, dtype=np.float64):
+    """
+    Create a zero-filled .npy file backed by a memory map. The file can be
+    reopened by other processes with open_memmap_volume.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    return np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=tuple(shape))
+
+
+def open_memmap_volume(path, mode='r'):
+    """Attach to a volume written by create_memmap_volume (or np.save)."""
+    return np.load(path, mmap_mode=mode)
+
+
+class SharedVolume:
+    """
+    A volume stored in a multiprocessing.shared_memory block.
+
+    The creating process owns the block and should call unlink() (or use the
+    object as a context manager) once all workers are done. Workers attach
+    with SharedVolume.attach(*volume.spec) and see the same memory, without
+    copying.
+    """
+
+    def __init__(self, block, shape, dtype, owner):
+        self._block = block
+        self.owner = owner
+        self.array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+    @classmethod
+    def create(cls, shape, dtype=np.float64):
+        dtype = np.dtype(dtype)
+        size = max(1, int(np.prod(shape)) * dtype.itemsize)
+        block = shared_memory.SharedMemory(create=True, size=size)
+        return cls(block, tuple(shape), dtype, owner=True)
+
+    @classmethod
+    def from_array(cls, array):
+        """Copy an existing array into a new shared block."""
+        volume = cls.create(array.shape, array.dtype)
+        volume.array[...] = array
+        return volume
+
+    @classmethod
+    def attach(cls, name, shape, dtype, readonly=False):
+        block = shared_memory.SharedMemory(name=name)
+        volume = cls(block, tuple(shape), np.dtype(dtype), owner=False)
+        if readonly:
+            volume.array.setflags(write=False)
+        return volume
+
+    @property
+    def spec(self):
+        """Picklable (name, shape, dtype) triple used by attach."""
+        return self._block.name, self.array.shape, self.array.dtype.str
+
+    def close(self):
+        # Drop the array view first so the buffer can be released
+        self.array = None
+        self._block.close()
+
+    def unlink(self):
+        self.close()
+        if self.owner:
+            self._block.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.owner:
+            self.unlink()
+        else:
+            self.close()